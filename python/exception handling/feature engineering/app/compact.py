@@ -0,0 +1,20 @@
+import argparse
+from utils import archive as ar
+
+# Pack the small ticket files into the Parquet archive, e.g. from a cron job:
+#   python compact.py --remove
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compact ticket JSON files into a Parquet archive partitioned by created month")
+    parser.add_argument("--json-dir", default="data/json/", help="directory with the ticket files")
+    parser.add_argument("--archive-dir", default="data/archive", help="archive directory")
+    parser.add_argument("--workers", type=int, default=8, help="threads reading the ticket files")
+    parser.add_argument("--remove", action="store_true", help="delete ticket files once they are archived")
+    parser.add_argument("--max-parts", type=int, default=8, help="small parts a month may have before they are merged")
+    args = parser.parse_args()
+
+    errors = ar.compact(args.json_dir, args.archive_dir, max_workers=args.workers, remove=args.remove,
+                        max_parts=args.max_parts)
+    for error in errors:
+        print(f"Could not read {error['file']} ({error['error']}): {error['message']}")
+    manifest = ar.load_manifest(args.archive_dir)
+    print(f"Archive: {len(manifest['files'])} file(s), {sum(p['rows'] for p in manifest['parts'])} ticket(s) in {len(manifest['parts'])} part(s)")
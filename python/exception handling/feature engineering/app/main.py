@@ -1,12 +1,11 @@
 import numpy as np
 import pandas as pd
 from utils import load_data as ld
-import os
+from utils.search_index import SearchIndex
+from utils.dedup import DuplicateDetector
 
-files = os.listdir("data/json")
-print("Files: ")
-print(files)
-print("##########################")
+# tickets are read from the Parquet archive, only files added since the last run are parsed
+archive_dir = "data/archive"
 
 # file_list = [ 
 #     "ticket_002_security_breach.json",
@@ -31,14 +30,27 @@ print("##########################")
 #     "ticket_020_disaster_recovery_test.json"
 # ]
 try:
-    df = ld.load_data(files)
+    df = ld.load_data(archive_dir=archive_dir)
+    if df.attrs["load_errors"]:
+        print(f"{len(df.attrs['load_errors'])} file(s) could not be loaded")
     print(df)
     print("Columns: ")
     print(df.columns)
 except Exception as e:
     print(f"Failed to load data: {e}")
 
-df = ld.add_cols(df)
+# full-text index of the tickets, only tickets not indexed yet are added
+index = SearchIndex("data/index")
+print(f"{index.add(df)} new ticket(s) indexed, {len(index.ticket_ids)} in total")
+print(index.search("printer driver", k=3))
+
+# near-duplicate tickets (MinHash + LSH), only new tickets are hashed
+detector = DuplicateDetector("data/dedup")
+print(f"{detector.add(df)} new ticket(s) checked for duplicates")
+print(detector.clusters())
+
+# df is still as loaded, its features can be cached under the loaded dataset version
+df = ld.add_cols(df, version=df.attrs["dataset_version"])
 print(df)
 print("Columns: ")
 print(df.columns)
\ No newline at end of file
@@ -0,0 +1,138 @@
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from utils import load_data as ld
+
+MANIFEST = "manifest.json"
+
+def load_manifest(archive_dir):
+    path = os.path.join(archive_dir, MANIFEST)
+    if not os.path.exists(path):
+        return {"files": {}, "parts": []}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_manifest(archive_dir, manifest):
+    # written to a temp file first, a crash never leaves half a manifest
+    path = os.path.join(archive_dir, MANIFEST)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(path + ".tmp", path)
+
+def created_month(df):
+    # "2024-01-16T11:20:00Z" -> "2024-01", tickets without a date go to "unknown"
+    if "created_date" not in df.columns:
+        return pd.Series("unknown", index=df.index)
+    return df["created_date"].astype("string").str[:7].fillna("unknown")
+
+def write_part(archive_dir, month, df):
+    # one new Parquet part of a month, written under a temporary name first; returns its manifest entry
+    part_dir = os.path.join(archive_dir, f"created_month={month}")
+    os.makedirs(part_dir, exist_ok=True)
+    part_path = os.path.join(part_dir, f"part-{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}.parquet")
+    df.to_parquet(part_path + ".tmp", index=False)
+    os.replace(part_path + ".tmp", part_path)
+    return {"path": os.path.relpath(part_path, archive_dir), "month": month, "rows": len(df)}
+
+def merge_parts(archive_dir="data/archive", months=None, max_parts=8, target_rows=250_000):
+    """
+    Rewrite the small parts (fewer than target_rows tickets) of a month as one part
+    once the month has more than max_parts of them, so frequent compactions do not
+    pile up small files again. The merged part takes the place of the first one in
+    the manifest, which is saved before the old parts are deleted.
+    Returns the number of parts merged away.
+    """
+    manifest = load_manifest(archive_dir)
+    small = {}
+    for part in manifest["parts"]:
+        if (months is None or part["month"] in months) and part["rows"] < target_rows:
+            small.setdefault(part["month"], []).append(part)
+    merged = 0
+    for month, parts in small.items():
+        if len(parts) <= max_parts:
+            continue
+        df = pd.concat([pd.read_parquet(os.path.join(archive_dir, p["path"])) for p in parts], ignore_index=True)
+        entry = write_part(archive_dir, month, df)
+        old = {p["path"] for p in parts}
+        # parts are in manifest order, the merged part replaces parts[0] and the others go
+        manifest["parts"] = [entry if p["path"] == parts[0]["path"] else p
+                             for p in manifest["parts"] if p["path"] not in old or p["path"] == parts[0]["path"]]
+        save_manifest(archive_dir, manifest)
+        for path in old:
+            os.remove(os.path.join(archive_dir, path))
+        merged += len(parts) - 1
+    return merged
+
+def compact(json_dir="data/json/", archive_dir="data/archive", file_names=None, max_workers=8, remove=False,
+            max_parts=8):
+    """
+    Pack the ticket files of json_dir that are not in the archive yet into Parquet
+    parts partitioned by created month (archive_dir/created_month=2024-01/part-*.parquet).
+    The manifest lists the packed files and the parts, so a run only reads new
+    files and appends new parts; a month with more than max_parts small parts has
+    them merged (see merge_parts). With remove the packed files are deleted.
+    Returns the errors of the files that could not be read (see load_records),
+    they are retried on the next run.
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    manifest = load_manifest(archive_dir)
+    if file_names is None:
+        file_names = [name for name in os.listdir(json_dir) if name.endswith(".json")]
+    new_files = sorted(name for name in set(file_names) if name not in manifest["files"])
+    if not new_files:
+        return []
+
+    records, errors = [], []
+    failed = set()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = pool.map(ld.read_ticket, [os.path.join(json_dir, name) for name in new_files])
+        for name, (tickets, error) in zip(new_files, results):
+            if error is not None:
+                errors.append(error)
+                failed.add(name)
+            records.extend(tickets)
+    months = []
+    if records:
+        df = pd.json_normalize(records)
+        df["created_month"] = created_month(df)
+        for month, part in df.groupby("created_month", sort=True):
+            manifest["parts"].append(write_part(archive_dir, month, part.drop(columns="created_month")))
+            months.append(month)
+
+    for name in new_files:
+        if name not in failed:
+            manifest["files"][name] = time.strftime("%Y-%m-%d %H:%M:%S")
+    save_manifest(archive_dir, manifest)
+    print(f"Compacted {len(new_files) - len(failed)} file(s) into {archive_dir}, {len(failed)} failed")
+    merged = merge_parts(archive_dir, months, max_parts)
+    if merged:
+        print(f"Merged {merged} small part(s) of {archive_dir}")
+
+    if remove:
+        for name in new_files:
+            if name not in failed:
+                os.remove(os.path.join(json_dir, name))
+    return errors
+
+def read_archive(archive_dir="data/archive", months=None, columns=None):
+    """
+    Read the archived tickets, only the parts of the given months (e.g. ["2024-01"])
+    when months is set, only the given columns when columns is set. Parts missing
+    from the manifest (a compaction that did not finish) are not read.
+    """
+    manifest = load_manifest(archive_dir)
+    parts = [p for p in manifest["parts"] if months is None or p["month"] in months]
+    frames = []
+    for part in parts:
+        path = os.path.join(archive_dir, part["path"])
+        try:
+            frames.append(pd.read_parquet(path, columns=columns))
+        except (KeyError, ValueError):
+            # a column this part does not have
+            frames.append(pd.read_parquet(path).reindex(columns=columns))
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,204 @@
+import json
+import os
+import zlib
+import numpy as np
+import pandas as pd
+from utils.search_index import tokenize
+
+DEDUP_FIELDS = ["description", "resolution_steps"]
+MAX_HASH = np.uint64(0xFFFFFFFF)
+PRIME = np.uint64((1 << 61) - 1)
+
+def ticket_shingles(row, k=3):
+    # hashed word k-grams of the description and resolution steps
+    parts = []
+    for field in DEDUP_FIELDS:
+        value = row.get(field)
+        if isinstance(value, (list, tuple, np.ndarray)):
+            parts.extend(map(str, value))
+        elif isinstance(value, str):
+            parts.append(value)
+    tokens = tokenize(" ".join(parts))
+    grams = {" ".join(tokens[i:i + k]) for i in range(max(len(tokens) - k + 1, 1 if tokens else 0))}
+    return np.array([zlib.crc32(g.encode()) for g in grams], dtype=np.uint64)
+
+def choose_bands(num_perm, threshold):
+    # bands x rows = num_perm with the highest LSH threshold (1/bands)^(1/rows) under threshold:
+    # pairs around the threshold still become candidates, the signature check filters the rest
+    options = [(b, num_perm // b) for b in range(1, num_perm + 1) if num_perm % b == 0]
+    below = [option for option in options if (1 / option[0]) ** (1 / option[1]) <= threshold]
+    return max(below or options[-1:], key=lambda option: (1 / option[0]) ** (1 / option[1]))
+
+class DuplicateDetector:
+    """
+    Near-duplicate tickets with MinHash and LSH, in sub-quadratic time:
+      - every ticket gets a MinHash signature of num_perm values over the hashed
+        word 3-grams of its description and resolution steps, computed in numpy
+        blocks of tickets
+      - signatures are cut into bands; tickets whose band matches land in the same
+        bucket, and are joined (union-find) with the bucket's first ticket when
+        their signatures agree on at least threshold of the values (≈ Jaccard similarity)
+      - the band tables are sorted key arrays looked up with searchsorted, and
+        everything is saved to state_dir, so add() on new tickets only hashes and
+        looks up those tickets
+    """
+
+    def __init__(self, state_dir="data/dedup", num_perm=128, threshold=0.6, seed=1):
+        self.state_dir = state_dir
+        self.config = {"num_perm": num_perm, "threshold": threshold, "seed": seed}
+        self.bands, self.rows = choose_bands(num_perm, threshold)
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, int(PRIME), num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, int(PRIME), num_perm, dtype=np.uint64)
+        self.band_mix = rng.integers(1, 1 << 63, self.rows, dtype=np.uint64) | np.uint64(1)
+        self.load()
+
+    # ---- state ----
+
+    def path(self, name):
+        return os.path.join(self.state_dir, name)
+
+    def load(self):
+        self.ticket_ids = []
+        self.signatures = np.empty((0, self.config["num_perm"]), dtype=np.uint32)
+        self.parent = np.empty(0, dtype=np.int64)
+        self.band_keys = [np.empty(0, dtype=np.uint64) for _ in range(self.bands)]
+        self.band_reps = [np.empty(0, dtype=np.int64) for _ in range(self.bands)]
+        if not os.path.exists(self.path("config.json")):
+            return
+        with open(self.path("config.json"), "r", encoding="utf-8") as f:
+            saved = json.load(f)
+        if saved != self.config:
+            raise ValueError(f"{self.state_dir} was built with {saved}, not {self.config}")
+        with open(self.path("ticket_ids.json"), "r", encoding="utf-8") as f:
+            self.ticket_ids = json.load(f)
+        self.signatures = np.load(self.path("signatures.npy"))
+        self.parent = np.load(self.path("parent.npy"))
+        bands = np.load(self.path("bands.npz"))
+        self.band_keys = [bands[f"keys_{j}"] for j in range(self.bands)]
+        self.band_reps = [bands[f"reps_{j}"] for j in range(self.bands)]
+
+    def save(self):
+        os.makedirs(self.state_dir, exist_ok=True)
+        with open(self.path("ticket_ids.json"), "w", encoding="utf-8") as f:
+            json.dump(self.ticket_ids, f)
+        np.save(self.path("signatures.npy"), self.signatures)
+        np.save(self.path("parent.npy"), self.parent)
+        np.savez(self.path("bands.npz"), **{f"keys_{j}": k for j, k in enumerate(self.band_keys)},
+                 **{f"reps_{j}": r for j, r in enumerate(self.band_reps)})
+        # the config goes last, it marks the state as complete
+        with open(self.path("config.json"), "w", encoding="utf-8") as f:
+            json.dump(self.config, f)
+
+    # ---- minhash ----
+
+    def signatures_of(self, shingle_sets, block_shingles=200_000):
+        """MinHash signatures (uint32, one row per ticket), empty tickets get all MAX_HASH."""
+        n = len(shingle_sets)
+        result = np.full((n, self.config["num_perm"]), MAX_HASH, dtype=np.uint64)
+        sizes = np.array([len(s) for s in shingle_sets], dtype=np.int64)
+        start = 0
+        while start < n:
+            # as many tickets as fit in block_shingles hashed shingles
+            stop = start + max(1, int(np.searchsorted(np.cumsum(sizes[start:]), block_shingles, side="right")))
+            block = [s for s in shingle_sets[start:stop] if len(s)]
+            if block:
+                hashes = np.concatenate(block)
+                # (a * x + b) mod p, kept to 32 bits; uint64 products wrap like the usual implementations
+                with np.errstate(over="ignore"):
+                    values = ((hashes[:, None] * self.a + self.b) % PRIME) & MAX_HASH
+                starts = np.concatenate([[0], np.cumsum([len(s) for s in block])[:-1]])
+                rows = np.flatnonzero(sizes[start:stop]) + start
+                result[rows] = np.minimum.reduceat(values, starts, axis=0)
+            start = stop
+        return result.astype(np.uint32)
+
+    def band_hashes(self, signatures):
+        # one 64 bit key per band: the band's values mixed with odd multipliers
+        sig = signatures.astype(np.uint64).reshape(len(signatures), self.bands, self.rows)
+        with np.errstate(over="ignore"):
+            return (sig * self.band_mix).sum(axis=2, dtype=np.uint64)
+
+    # ---- union-find ----
+
+    def find(self, i):
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(self, i, j):
+        ri, rj = self.find(i), self.find(j)
+        if ri != rj:
+            self.parent[max(ri, rj)] = min(ri, rj)
+
+    # ---- public ----
+
+    def add(self, df):
+        """Add the tickets of df not seen yet. Returns how many were added."""
+        if "ticket_id" not in df.columns:
+            print("Tickets without a ticket_id column cannot be deduplicated")
+            return 0
+        seen = set(self.ticket_ids)
+        new = df[df["ticket_id"].notna() & ~df["ticket_id"].isin(seen)].drop_duplicates("ticket_id")
+        if new.empty:
+            return 0
+        # missing text columns read as NaN, those tickets have no shingles
+        shingle_sets = [ticket_shingles(row) for row in new.reindex(columns=DEDUP_FIELDS).to_dict("records")]
+        signatures = self.signatures_of(shingle_sets)
+
+        first = len(self.ticket_ids)
+        ids = np.arange(first, first + len(new))
+        self.ticket_ids.extend(new["ticket_id"].tolist())
+        self.signatures = np.vstack([self.signatures, signatures])
+        self.parent = np.concatenate([self.parent, ids])
+
+        has_text = np.array([len(s) > 0 for s in shingle_sets], dtype=bool)
+        keys = self.band_hashes(signatures)
+        candidates = []
+        for j in range(self.bands):
+            band_keys, band_reps = self.band_keys[j], self.band_reps[j]
+            k, docs = keys[has_text, j], ids[has_text]
+            # buckets that already have a first ticket
+            pos = np.minimum(np.searchsorted(band_keys, k), max(len(band_keys) - 1, 0))
+            hit = (band_keys[pos] == k) if len(band_keys) else np.zeros(len(k), dtype=bool)
+            candidates.append(np.column_stack([docs[hit], band_reps[pos[hit]]]))
+            # new buckets: their first ticket of this batch becomes the bucket's first ticket
+            unique_keys, first_index, inverse = np.unique(k[~hit], return_index=True, return_inverse=True)
+            reps = docs[~hit][first_index]
+            candidates.append(np.column_stack([docs[~hit], reps[inverse]]))
+            order = np.argsort(np.concatenate([band_keys, unique_keys]), kind="stable")
+            self.band_keys[j] = np.concatenate([band_keys, unique_keys])[order]
+            self.band_reps[j] = np.concatenate([band_reps, reps])[order]
+
+        # a pair found in several bands is checked once: (i, j) as the single number i * n + j
+        pairs = np.vstack(candidates)
+        pairs = pairs[pairs[:, 0] != pairs[:, 1]]
+        n = len(self.ticket_ids)
+        codes = np.unique(pairs[:, 0] * n + pairs[:, 1])
+        pairs = np.column_stack([codes // n, codes % n])
+        if len(pairs):
+            agreement = (self.signatures[pairs[:, 0]] == self.signatures[pairs[:, 1]]).mean(axis=1)
+            for i, j in pairs[agreement >= self.config["threshold"]]:
+                self.union(int(i), int(j))
+        self.save()
+        return len(new)
+
+    def clusters(self, min_size=2):
+        """Duplicate clusters as a DataFrame of ticket_id, cluster (its first ticket) and cluster_size."""
+        if not len(self.parent):
+            return pd.DataFrame({"ticket_id": [], "cluster": [], "cluster_size": []})
+        # pointer jumping: every ticket ends up pointing at its root in a few vectorized steps
+        roots = self.parent
+        while True:
+            jumped = roots[roots]
+            if np.array_equal(jumped, roots):
+                break
+            roots = jumped
+        self.parent = roots
+        sizes = np.bincount(roots)[roots]
+        keep = sizes >= min_size
+        ticket_ids = np.array(self.ticket_ids, dtype=object)
+        result = pd.DataFrame({"ticket_id": ticket_ids[keep], "cluster": ticket_ids[roots[keep]], "cluster_size": sizes[keep]})
+        return result.sort_values(["cluster_size", "cluster"], ascending=[False, True], ignore_index=True)
@@ -0,0 +1,149 @@
+import hashlib
+import inspect
+import os
+import numpy as np
+import pandas as pd
+
+# name -> (function, required columns, description), filled by @feature
+FEATURES = {}
+
+def feature(name, requires, description=""):
+    """
+    Register a ticket feature: a function taking the DataFrame and returning one
+    vectorized Series, declared once with the columns it reads.
+    """
+    def register(func):
+        FEATURES[name] = (func, tuple(requires), description)
+        return func
+    return register
+
+# ---- features ----
+
+@feature("name_length", ["user.name"], "characters in the user's name")
+def name_length(df):
+    return df["user.name"].str.len()
+
+@feature("department_length", ["user.department"], "characters in the department")
+def department_length(df):
+    return df["user.department"].str.len()
+
+@feature("email_length", ["user.email"], "characters in the email address")
+def email_length(df):
+    return df["user.email"].str.len()
+
+@feature("email_domain", ["user.email"], "part of the email address after @")
+def email_domain(df):
+    return df["user.email"].str.extract(r"@([^@]+)$", expand=False).str.lower()
+
+@feature("tag_count", ["tags"], "number of tags")
+def tag_count(df):
+    # .str.len() also counts lists (and the arrays read back from Parquet)
+    return df["tags"].str.len()
+
+@feature("resolution_step_count", ["resolution_steps"], "number of resolution steps")
+def resolution_step_count(df):
+    return df["resolution_steps"].str.len()
+
+@feature("resolution_hours", ["created_date", "resolved_date"], "hours from creation to resolution")
+def resolution_hours(df):
+    created = pd.to_datetime(df["created_date"], errors="coerce", utc=True)
+    resolved = pd.to_datetime(df["resolved_date"], errors="coerce", utc=True)
+    return (resolved - created).dt.total_seconds() / 3600
+
+PRIORITY_LEVELS = {"LOW": 0, "MEDIUM": 1, "HIGH": 2, "CRITICAL": 3}
+
+@feature("priority_level", ["priority"], "priority as an ordinal, LOW=0 .. CRITICAL=3")
+def priority_level(df):
+    return df["priority"].str.upper().map(PRIORITY_LEVELS).astype("Int8")
+
+@feature("time_spent_bucket", ["time_spent_minutes"], "time spent: <1h, 1-4h, 4-24h, >1d")
+def time_spent_bucket(df):
+    return pd.cut(df["time_spent_minutes"], bins=[0, 60, 240, 1440, np.inf],
+                  labels=["<1h", "1-4h", "4-24h", ">1d"], right=False)
+
+@feature("created_weekday", ["created_date"], "day of the week the ticket was created, Monday=0")
+def created_weekday(df):
+    return pd.to_datetime(df["created_date"], errors="coerce", utc=True).dt.weekday.astype("Int8")
+
+# ---- computing ----
+
+def column_hash(series):
+    # list-like cells (tags, resolution_steps) are not hashable, hash their text instead
+    if series.dtype == object:
+        series = series.map(lambda v: "\x1f".join(map(str, v)) if isinstance(v, (list, tuple, np.ndarray)) else v)
+    return pd.util.hash_pandas_object(series, index=True).to_numpy().tobytes()
+
+def index_token(index):
+    # the rows of the frame: a filtered or reordered frame of the same dataset gets another key
+    if isinstance(index, pd.RangeIndex):
+        return f"range:{index.start}:{index.stop}:{index.step}".encode()
+    return pd.util.hash_pandas_object(index).to_numpy().tobytes()
+
+def feature_key(name, df, version=None):
+    """
+    The dataset version a feature sees: its code and its required columns. With a
+    version (the dataset_version of load_data, for a frame unchanged since loading)
+    the columns are identified by it and the rows of df, which costs nothing per
+    call, else by hashing their content.
+    """
+    func, requires, _ = FEATURES[name]
+    digest = hashlib.sha1(name.encode())
+    digest.update(inspect.getsource(func).encode())
+    if version is not None:
+        digest.update(f"{version}:{','.join(requires)}".encode())
+        digest.update(index_token(df.index))
+        return digest.hexdigest()[:16]
+    for col in requires:
+        digest.update(col.encode())
+        digest.update(column_hash(df[col]))
+    return digest.hexdigest()[:16]
+
+class FeatureStore:
+    """
+    Computes registered features lazily, only the ones asked for, and caches each
+    one per dataset version (feature_key): in memory, and as Parquet in cache_dir
+    when given, so a later experiment on the same data reuses them. Pass version
+    only for a frame exactly as load_data returned it; without one the features
+    are keyed on the content of their columns, so edits are always seen.
+    """
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir
+        self.memory = {}
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def get(self, df, name, version=None):
+        func, requires, _ = FEATURES[name]
+        missing = [col for col in requires if col not in df.columns]
+        if missing:
+            print(f"Feature {name} skipped, missing column(s): {missing}")
+            return None
+        key = feature_key(name, df, version)
+        if key in self.memory:
+            return self.memory[key]
+        path = os.path.join(self.cache_dir, f"{name}-{key}.parquet") if self.cache_dir else None
+        if path and os.path.exists(path):
+            values = pd.read_parquet(path)[name]
+        else:
+            values = func(df).rename(name)
+            if path:
+                values.to_frame().to_parquet(path)
+        self.memory[key] = values
+        return values
+
+    def compute(self, df, names=None, version=None):
+        """The requested features (all registered ones when names is None) as one DataFrame."""
+        names = list(FEATURES) if names is None else names
+        unknown = [name for name in names if name not in FEATURES]
+        if unknown:
+            raise KeyError(f"Unknown feature(s): {unknown}, registered: {list(FEATURES)}")
+        columns = {name: self.get(df, name, version) for name in names}
+        return pd.DataFrame({name: values for name, values in columns.items() if values is not None}, index=df.index)
+
+default_store = FeatureStore()
+
+def add_features(df, names=None, store=None, version=None):
+    """Return df with the requested features added, all in one assignment."""
+    features = (store or default_store).compute(df, names, version)
+    return df.assign(**{name: features[name] for name in features.columns})
@@ -1,33 +1,105 @@
 import pandas as pd
+import hashlib
 import json
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from utils import archive as ar
+from utils import features as ft
 
-def load_data(path_list):
-    dfs = []
-    prefix_path = "data/json/"
-    for file_path in path_list:
-        full_path = prefix_path+file_path
+def read_ticket(full_path):
+    # returns (records, error): the ticket(s) of one file as plain dicts, or what went wrong
+    try:
+        with open(full_path,"r", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError as e:
+        return [], {"file": full_path, "error": "not_found", "message": str(e)}
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        return [], {"file": full_path, "error": "invalid_json", "message": str(e)}
+    except OSError as e:
+        return [], {"file": full_path, "error": "unreadable", "message": str(e)}
+    # a file holds one ticket, or a list of them
+    if isinstance(data, list):
+        return [t for t in data if isinstance(t, dict)], None
+    if isinstance(data, dict):
+        return [data], None
+    return [], {"file": full_path, "error": "not_a_ticket", "message": f"top level is {type(data).__name__}"}
+
+def load_records(path_list, prefix_path="data/json/", max_workers=8, use_processes=False):
+    """
+    Read and parse the ticket files concurrently (threads by default, processes
+    for parsing-heavy batches) and collect plain dicts, no DataFrame per file.
+    Returns (records, errors), errors being one dict per unreadable file with
+    file, error (not_found / invalid_json / unreadable / not_a_ticket) and message.
+    """
+    full_paths = [os.path.join(prefix_path, file_path) for file_path in path_list]
+    records, errors = [], []
+    if not full_paths:
+        return records, errors
+    executor = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    with executor(max_workers=max_workers) as pool:
+        # big chunks keep the per-file overhead of a process pool low
+        chunksize = max(1, len(full_paths) // (max_workers * 4)) if use_processes else 1
+        for tickets, error in pool.map(read_ticket, full_paths, chunksize=chunksize):
+            records.extend(tickets)
+            if error is not None:
+                errors.append(error)
+    return records, errors
+
+def dataset_version(items):
+    # a short hash standing for what was loaded, stored in df.attrs["dataset_version"]
+    return hashlib.sha1(json.dumps(items, sort_keys=True).encode()).hexdigest()[:16]
+
+def files_version(full_paths):
+    # name, size and modification time of the files, a cheap stand-in for their content
+    items = []
+    for path in sorted(full_paths):
         try:
-            with open(full_path,"r", encoding="utf-8") as f:
-                data = json.load(f)
-        except FileNotFoundError:
-            print(f"File not found! path: {full_path}")
-        # flatten nested JSON into a DataFrame
-        df = pd.json_normalize(data)
-        dfs.append(df)
-    
-    final_df = pd.concat(dfs,ignore_index=True)
-    final_df.shape
+            stat = os.stat(path)
+            items.append([path, stat.st_size, stat.st_mtime_ns])
+        except OSError:
+            items.append([path, None, None])
+    return dataset_version(items)
+
+def load_data(path_list=None, prefix_path="data/json/", max_workers=8, use_processes=False, archive_dir=None):
+    """
+    Load the ticket files into one DataFrame with nested fields flattened
+    (user.name, user.department, ...): the files are read concurrently
+    (see load_records) and flattened by a single json_normalize over all records.
+    path_list defaults to every .json file of prefix_path. With archive_dir, only
+    files not yet archived are read and compacted into the Parquet archive (see
+    archive.compact), and the tickets come from the archive.
+    Unreadable files are skipped, reported, and kept in df.attrs["load_errors"].
+    df.attrs["dataset_version"] identifies what was loaded (the archive's parts, or
+    the files' names, sizes and mtimes), pass it to add_cols while df is unchanged.
+    """
+    if archive_dir is not None:
+        errors = ar.compact(prefix_path, archive_dir, path_list, max_workers)
+        final_df = ar.read_archive(archive_dir)
+        version = dataset_version(ar.load_manifest(archive_dir)["parts"])
+    else:
+        if path_list is None:
+            path_list = sorted(name for name in os.listdir(prefix_path) if name.endswith(".json"))
+        records, errors = load_records(path_list, prefix_path, max_workers, use_processes)
+        final_df = None
+        version = files_version([os.path.join(prefix_path, file_path) for file_path in path_list])
+    for error in errors:
+        if error["error"] == "not_found":
+            print(f"File not found! path: {error['file']}")
+        else:
+            print(f"Could not read {error['file']} ({error['error']}): {error['message']}")
+
+    if final_df is None:
+        # flatten nested JSON of the whole batch at once
+        final_df = pd.json_normalize(records)
+    final_df.attrs["load_errors"] = errors
+    final_df.attrs["dataset_version"] = version
     return final_df
 
-def add_cols(df):
-    # per-row string length
-    # In case any values are missing (NaN) or non-string types (like numbers), .str.len() would raise an error.
+def add_cols(df, names=("name_length", "department_length", "email_length"), version=None):
+    # features come from the registry in utils/features.py, computed only when asked for
+    # and cached per dataset version (or per column content without one); missing
+    # columns are reported instead of raising
     try:
-        df["name_length"] = df["user.name"].str.len()
-        df["department_length"] = df["user.department"].str.len()
-        df["email_length"] = df["user.email"].str.len()
-        return df
+        return ft.add_features(df, list(names), version=version)
     except Exception as e:
         print(f"Error occured: {e}")
-    
-
@@ -0,0 +1,297 @@
+import json
+import mmap
+import os
+import re
+from collections import Counter
+import numpy as np
+import pandas as pd
+
+TEXT_FIELDS = ["subject", "description", "resolution", "root_cause", "tags"]
+STOPWORDS = {"a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "in", "is", "it",
+             "of", "on", "or", "that", "the", "to", "was", "were", "with"}
+TOKEN = re.compile(r"[a-z0-9]+")
+
+def tokenize(text):
+    # lowercase words and numbers, stopwords and single characters dropped
+    return [t for t in TOKEN.findall(str(text).lower()) if len(t) > 1 and t not in STOPWORDS]
+
+def ticket_text(row):
+    parts = []
+    for field in TEXT_FIELDS:
+        value = row.get(field)
+        if isinstance(value, (list, tuple, np.ndarray)):
+            parts.extend(map(str, value))
+        elif isinstance(value, str):
+            parts.append(value)
+    return " ".join(parts)
+
+# ---- postings compression: doc id gaps and term frequencies as varints ----
+
+def encode_varints(values):
+    """Unsigned integers as LEB128 varints (7 bits per byte, high bit = more bytes follow)."""
+    values = np.asarray(values, dtype=np.uint64)
+    nbytes = np.ones(len(values), dtype=np.int64)
+    for k in range(1, 10):
+        nbytes += values >= (np.uint64(1) << np.uint64(7 * k))
+    offsets = np.concatenate([[0], np.cumsum(nbytes)[:-1]])
+    out = np.zeros(int(nbytes.sum()), dtype=np.uint8)
+    for k in range(int(nbytes.max()) if len(values) else 0):
+        mask = nbytes > k
+        byte = (values[mask] >> np.uint64(7 * k)) & np.uint64(0x7F)
+        more = (nbytes[mask] > k + 1).astype(np.uint64) << np.uint64(7)
+        out[offsets[mask] + k] = (byte | more).astype(np.uint8)
+    return out.tobytes()
+
+def decode_varints(data):
+    buf = np.frombuffer(data, dtype=np.uint8)
+    if not len(buf):
+        return np.empty(0, dtype=np.uint64)
+    ends = np.flatnonzero(buf < 0x80)
+    starts = np.concatenate([[0], ends[:-1] + 1])
+    position = np.arange(len(buf)) - np.repeat(starts, ends - starts + 1)
+    shifted = (buf & 0x7F).astype(np.uint64) << (7 * position).astype(np.uint64)
+    return np.add.reduceat(shifted, starts)
+
+def encode_postings(doc_ids, tfs):
+    gaps = np.diff(doc_ids, prepend=0)
+    return encode_varints(np.concatenate([gaps, tfs]))
+
+def decode_postings(data, count):
+    values = decode_varints(data)
+    return np.cumsum(values[:count]).astype(np.int64), values[count:].astype(np.int64)
+
+# ---- index ----
+
+class Segment:
+    """
+    One immutable part of the index on disk:
+      - terms.json: term -> [offset, length, document frequency] in postings.bin
+      - postings.bin: per term the varint doc id gaps, then the varint term frequencies
+      - docs.json / lengths.npy: ticket id and token count of every document
+    postings.bin is memory-mapped, a query only touches the bytes of its terms.
+    """
+
+    def __init__(self, path, base):
+        self.path = path
+        self.base = base  # global doc id of the segment's first document
+        with open(os.path.join(path, "terms.json"), "r", encoding="utf-8") as f:
+            self.terms = json.load(f)
+        with open(os.path.join(path, "docs.json"), "r", encoding="utf-8") as f:
+            self.ticket_ids = json.load(f)
+        self.lengths = np.load(os.path.join(path, "lengths.npy"))
+        self._file = open(os.path.join(path, "postings.bin"), "rb")
+        size = os.path.getsize(os.path.join(path, "postings.bin"))
+        self.postings = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def lookup(self, term):
+        # (global doc ids, term frequencies) of a term in this segment
+        entry = self.terms.get(term)
+        if entry is None:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        offset, length, count = entry
+        docs, tfs = decode_postings(self.postings[offset:offset + length], count)
+        return docs + self.base, tfs
+
+    def close(self):
+        if isinstance(self.postings, mmap.mmap):
+            self.postings.close()
+        self._file.close()
+
+    @staticmethod
+    def write(path, ticket_ids, lengths, postings):
+        """Write a segment: postings maps term -> (sorted local doc ids, term frequencies)."""
+        os.makedirs(path, exist_ok=True)
+        lexicon, offset = {}, 0
+        with open(os.path.join(path, "postings.bin"), "wb") as f:
+            for term in sorted(postings):
+                docs, tfs = postings[term]
+                data = encode_postings(np.asarray(docs), np.asarray(tfs))
+                f.write(data)
+                lexicon[term] = [offset, len(data), len(docs)]
+                offset += len(data)
+        with open(os.path.join(path, "terms.json"), "w", encoding="utf-8") as f:
+            json.dump(lexicon, f)
+        with open(os.path.join(path, "docs.json"), "w", encoding="utf-8") as f:
+            json.dump(list(ticket_ids), f)
+        np.save(os.path.join(path, "lengths.npy"), np.asarray(lengths, dtype=np.int32))
+
+def size_tier(docs, merge_factor):
+    # 0 for segments under merge_factor documents, 1 under merge_factor², ...
+    return int(np.log(max(docs, 1)) / np.log(merge_factor))
+
+def tail_to_merge(sizes, merge_factor):
+    """
+    Index of the first of the tail segments to merge, None when no merge is due: the
+    trailing segments in the last segment's size tier or below, once there are
+    merge_factor of them. Each merge moves documents up a tier, so a document is
+    rewritten about once per tier and there are at most about merge_factor segments per tier.
+    """
+    if not sizes:
+        return None
+    tier = size_tier(sizes[-1], merge_factor)
+    start = len(sizes)
+    while start > 0 and size_tier(sizes[start - 1], merge_factor) <= tier:
+        start -= 1
+    return start if len(sizes) - start >= merge_factor else None
+
+def build_postings(token_lists):
+    # term -> (doc ids, term frequencies) of documents 0..n-1
+    postings = {}
+    for doc, tokens in enumerate(token_lists):
+        for term, count in Counter(tokens).items():
+            docs, tfs = postings.setdefault(term, ([], []))
+            docs.append(doc)
+            tfs.append(count)
+    return postings
+
+class SearchIndex:
+    """
+    On-disk inverted index over the ticket text fields (TEXT_FIELDS):
+      - add(df) indexes tickets whose ticket_id is not indexed yet as a new segment,
+        so loading new ticket files only costs their own indexing
+      - search(query) ranks tickets with BM25, search_boolean(query) answers
+        AND / OR / NOT queries ("printer driver OR spooler NOT network")
+      - small segments are merged tier by tier (see tail_to_merge): merge_factor
+        segments of about the same size at the end become one, so an add rewrites
+        only the small tail, never the whole index; merge() rewrites everything as one
+    Indexed tickets are never updated, a changed ticket keeps its first version.
+    """
+
+    def __init__(self, index_dir="data/index", merge_factor=10, k1=1.2, b=0.75):
+        self.index_dir = index_dir
+        self.merge_factor = merge_factor
+        self.k1, self.b = k1, b
+        os.makedirs(index_dir, exist_ok=True)
+        self.load()
+
+    def manifest_path(self):
+        return os.path.join(self.index_dir, "manifest.json")
+
+    def load(self):
+        self.segments = []
+        names = []
+        if os.path.exists(self.manifest_path()):
+            with open(self.manifest_path(), "r", encoding="utf-8") as f:
+                names = json.load(f)["segments"]
+        base = 0
+        for name in names:
+            segment = Segment(os.path.join(self.index_dir, name), base)
+            self.segments.append(segment)
+            base += len(segment.ticket_ids)
+        self.ticket_ids = [tid for segment in self.segments for tid in segment.ticket_ids]
+        self.indexed = set(self.ticket_ids)
+        self.lengths = np.concatenate([s.lengths for s in self.segments]) if self.segments else np.empty(0, dtype=np.int32)
+
+    def save_manifest(self, names):
+        with open(self.manifest_path() + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"segments": names}, f)
+        os.replace(self.manifest_path() + ".tmp", self.manifest_path())
+
+    def next_segment_name(self, names):
+        return f"segment-{(int(names[-1].split('-')[1]) + 1) if names else 1:06d}"
+
+    def close(self):
+        for segment in self.segments:
+            segment.close()
+
+    def add(self, df):
+        """Index the tickets of df that are not in the index yet. Returns how many were added."""
+        if "ticket_id" not in df.columns:
+            print("Tickets without a ticket_id column cannot be indexed")
+            return 0
+        new = df[df["ticket_id"].notna() & ~df["ticket_id"].isin(self.indexed)].drop_duplicates("ticket_id")
+        if new.empty:
+            return 0
+        columns = [c for c in TEXT_FIELDS if c in new.columns]
+        token_lists = [tokenize(ticket_text(row)) for row in new[columns].to_dict("records")]
+        names = [os.path.basename(s.path) for s in self.segments]
+        name = self.next_segment_name(names)
+        Segment.write(os.path.join(self.index_dir, name), new["ticket_id"].tolist(),
+                      [len(tokens) for tokens in token_lists], build_postings(token_lists))
+        self.save_manifest(names + [name])
+        self.close()
+        self.load()
+        while True:
+            start = tail_to_merge([len(s.ticket_ids) for s in self.segments], self.merge_factor)
+            if start is None:
+                break
+            self.merge(start)
+        return len(new)
+
+    def merge(self, start=0):
+        """Rewrite the segments from start on (all of them by default) as a single one."""
+        tail = self.segments[start:]
+        if len(tail) <= 1:
+            return
+        # segments are read in order, so the doc ids stay sorted per term; the merged
+        # segment takes the place of the tail, its documents keep their global doc ids
+        base = tail[0].base
+        terms = set().union(*(segment.terms for segment in tail))
+        postings = {}
+        for term in terms:
+            parts = [segment.lookup(term) for segment in tail]
+            postings[term] = (np.concatenate([d for d, _ in parts]) - base, np.concatenate([t for _, t in parts]))
+        names = [os.path.basename(s.path) for s in self.segments]
+        name = self.next_segment_name(names)
+        Segment.write(os.path.join(self.index_dir, name), self.ticket_ids[base:], self.lengths[base:], postings)
+        self.save_manifest(names[:start] + [name])
+        self.close()
+        for old in names[start:]:
+            for file_name in ("terms.json", "postings.bin", "docs.json", "lengths.npy"):
+                os.remove(os.path.join(self.index_dir, old, file_name))
+            os.rmdir(os.path.join(self.index_dir, old))
+        self.load()
+
+    def postings(self, term):
+        parts = [segment.lookup(term) for segment in self.segments]
+        if not parts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        return np.concatenate([d for d, _ in parts]), np.concatenate([t for _, t in parts])
+
+    def search(self, query, k=10):
+        """The k best tickets for query by BM25, as a DataFrame of ticket_id and score."""
+        n = len(self.ticket_ids)
+        terms = set(tokenize(query))
+        if not n or not terms:
+            return pd.DataFrame({"ticket_id": [], "score": []})
+        avg_length = self.lengths.mean() or 1.0
+        scores = np.zeros(n, dtype=np.float32)
+        for term in terms:
+            docs, tfs = self.postings(term)
+            if not len(docs):
+                continue
+            idf = np.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self.lengths[docs] / avg_length)
+            scores[docs] += (idf * tfs * (self.k1 + 1) / (tfs + norm)).astype(np.float32)
+        hits = np.flatnonzero(scores)
+        top = hits[np.argsort(-scores[hits], kind="stable")[:k]]
+        return pd.DataFrame({"ticket_id": [self.ticket_ids[i] for i in top], "score": scores[top]})
+
+    def search_boolean(self, query):
+        """
+        Ticket ids matching a boolean query: terms are ANDed, OR separates
+        alternatives, NOT excludes the next term ("printer driver OR spooler NOT network").
+        """
+        matches = np.empty(0, dtype=np.int64)
+        for group in re.split(r"\s+OR\s+", query.strip()):
+            words = group.split()
+            include, exclude = [], []
+            negate = False
+            for word in words:
+                if word == "AND":
+                    continue
+                if word == "NOT":
+                    negate = True
+                    continue
+                for term in tokenize(word):
+                    (exclude if negate else include).append(term)
+                negate = False
+            if not include:
+                continue
+            docs = self.postings(include[0])[0]
+            for term in include[1:]:
+                docs = np.intersect1d(docs, self.postings(term)[0], assume_unique=True)
+            for term in exclude:
+                docs = np.setdiff1d(docs, self.postings(term)[0], assume_unique=True)
+            matches = np.union1d(matches, docs)
+        return [self.ticket_ids[i] for i in matches]
@@ -0,0 +1,189 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from utils import load_data as ld
+from utils import preprocessing as pp
+
+# results of a reference run, compared against until --update-baseline saves a new one
+baseline_file = os.path.join("benchmarks", "benchmark_baseline.json")
+sizes = {"small": 300_000, "medium": 3_000_000, "large": 30_000_000}
+
+OCCUPATIONS = ["Laborers", "Sales staff", "Core staff", "Managers", "Drivers", "High skill tech staff",
+               "Accountants", "Medicine staff", "Security staff", "Cooking staff", "Cleaning staff",
+               "Private service staff", "Low-skill Laborers", "Waiters/barmen staff", "Secretaries",
+               "Realty agents", "HR staff", "IT staff"]
+
+def generate_chunk(rows, start, rng, extra_columns=40):
+    """One chunk of application_train-shaped data: ids, a skewed target, object columns,
+    lognormal amounts, day counts (with the 365243 placeholder of DAYS_EMPLOYED), flags,
+    and sparse building columns, with null ratios close to the real file"""
+    def with_nulls(values, ratio):
+        values = values.astype(np.float64)
+        values[rng.random(rows) < ratio] = np.nan
+        return values
+
+    def choice(options, p=None, null_ratio=0.0):
+        values = np.asarray(options, dtype=object)[rng.choice(len(options), rows, p=p)]
+        if null_ratio:
+            values[rng.random(rows) < null_ratio] = None
+        return values
+
+    income = rng.lognormal(11.9, 0.5, rows).round(1)
+    credit = (income * rng.lognormal(1.2, 0.6, rows)).round(1)
+    employed = -rng.gamma(1.5, 1500, rows).astype(np.int64)
+    employed[rng.random(rows) < 0.18] = 365243
+    data = {
+        "SK_ID_CURR": np.arange(start, start + rows) + 100002,
+        "TARGET": (rng.random(rows) < 0.08).astype(np.int64),
+        "NAME_CONTRACT_TYPE": choice(["Cash loans", "Revolving loans"], [0.9, 0.1]),
+        "CODE_GENDER": choice(["F", "M", "XNA"], [0.658, 0.34199, 0.00001]),
+        "FLAG_OWN_CAR": choice(["N", "Y"], [0.66, 0.34]),
+        "CNT_CHILDREN": np.minimum(rng.poisson(0.42, rows), 19),
+        "AMT_INCOME_TOTAL": income,
+        "AMT_CREDIT": credit,
+        "AMT_ANNUITY": with_nulls((credit * rng.uniform(0.03, 0.08, rows)).round(1), 0.00004),
+        "DAYS_BIRTH": -rng.integers(7489, 25229, rows),
+        "DAYS_EMPLOYED": employed,
+        "OWN_CAR_AGE": with_nulls(np.minimum(rng.gamma(2, 6, rows).round(), 91), 0.66),
+        "OCCUPATION_TYPE": choice(OCCUPATIONS, None, 0.31),
+        "ORGANIZATION_TYPE": choice([f"Business Entity Type {i}" for i in range(1, 4)] + [f"Industry: type {i}" for i in range(1, 14)] + ["Self-employed", "Other", "XNA"]),
+        "EXT_SOURCE_1": with_nulls(rng.beta(2, 2, rows), 0.56),
+        "EXT_SOURCE_2": with_nulls(rng.beta(4, 2.5, rows), 0.002),
+        "EXT_SOURCE_3": with_nulls(rng.beta(3, 2.5, rows), 0.2),
+    }
+    for i in range(extra_columns):
+        if i % 2:
+            data[f"FLAG_DOCUMENT_{i}"] = (rng.random(rows) < 0.02 + i / 200).astype(np.int64)
+        else:
+            data[f"BUILDING_{i}_AVG"] = with_nulls(rng.beta(1.2, 6, rows).round(4), 0.48 + i / 200)
+    return pd.DataFrame(data)
+
+def generate_data(path, rows, extra_columns=40, chunk_rows=1_000_000, seed=42):
+    """Write rows of synthetic data to path as CSV, chunk_rows at a time so 30M rows
+    never have to fit in memory"""
+    rng = np.random.default_rng(seed)
+    for start in range(0, rows, chunk_rows):
+        chunk = generate_chunk(min(chunk_rows, rows - start), start, rng, extra_columns)
+        chunk.to_csv(path, mode="w" if start == 0 else "a", header=start == 0, index=False)
+
+def measure(function, repeat, memory=True):
+    """Best wall time of repeat calls of function, and the peak memory traced while
+    running it once more (tracing slows python code down, so it is kept out of the timing).
+    The functions' own prints are silenced"""
+    best = None
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = function()
+            seconds = time.perf_counter() - start
+            best = seconds if best is None else min(best, seconds)
+        peak_mb = None
+        if memory:
+            tracemalloc.start()
+            function()
+            peak_mb = tracemalloc.get_traced_memory()[1] / 1024**2
+            tracemalloc.stop()
+    return result, best, peak_mb
+
+def summarize(seconds, peak_mb, rows, frame=None):
+    return {"seconds": seconds, "rows": rows, "rows_per_sec": rows / seconds if seconds else None,
+            "peak_mb": peak_mb, "frame_mb": frame.memory_usage(deep=True).sum() / 1024**2 if frame is not None else None}
+
+def run_benchmark(path, repeat=3, n_jobs=1, memory=True):
+    """Measure load_data, optimize_dataframe, treat_nulls and find_outliers_iqr one by one,
+    each on the output of the previous step. Returns step -> measurements"""
+    results = {}
+    df, seconds, peak_mb = measure(lambda: ld.load_data(path), repeat, memory)
+    results["load_data"] = summarize(seconds, peak_mb, len(df), df)
+
+    optimized, seconds, peak_mb = measure(lambda: pp.optimize_dataframe(df, n_jobs=n_jobs), repeat, memory)
+    results["optimize_dataframe"] = summarize(seconds, peak_mb, len(optimized), optimized)
+
+    cleaned, seconds, peak_mb = measure(lambda: pp.treat_nulls(optimized, n_jobs=n_jobs), repeat, memory)
+    results["treat_nulls"] = summarize(seconds, peak_mb, len(cleaned), cleaned)
+
+    _, seconds, peak_mb = measure(lambda: pp.find_outliers_iqr(cleaned, n_jobs=n_jobs), repeat, memory)
+    results["find_outliers_iqr"] = summarize(seconds, peak_mb, len(cleaned))
+    return results
+
+def compare(results, baseline, threshold):
+    """Regressions of results against baseline: throughput that dropped, or peak
+    memory that grew, by more than threshold (0.2 is 20%)"""
+    regressions = []
+    for name, current in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        rows_per_sec = current["rows_per_sec"]
+        if before["rows_per_sec"] and rows_per_sec is not None and rows_per_sec < before["rows_per_sec"] * (1 - threshold):
+            regressions.append(f"{name}: {current['rows_per_sec']:,.0f} rows/sec, baseline {before['rows_per_sec']:,.0f}")
+        if before["peak_mb"] and current["peak_mb"] and current["peak_mb"] > before["peak_mb"] * (1 + threshold):
+            regressions.append(f"{name}: peak {current['peak_mb']:.1f} MB, baseline {before['peak_mb']:.1f} MB")
+    return regressions
+
+def print_results(results):
+    print(f"{'step':<20}{'seconds':>10}{'rows':>12}{'rows/sec':>14}{'peak MB':>10}{'frame MB':>10}")
+    for name, r in results.items():
+        peak_mb = f"{r['peak_mb']:.1f}" if r["peak_mb"] is not None else "-"
+        frame_mb = f"{r['frame_mb']:.1f}" if r["frame_mb"] is not None else "-"
+        print(f"{name:<20}{r['seconds']:>10.3f}{r['rows']:>12}{r['rows_per_sec'] or 0:>14,.0f}{peak_mb:>10}{frame_mb:>10}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the banking preprocessing steps on synthetic application_train-shaped data")
+    parser.add_argument("--size", choices=sizes, default="small", help="300k, 3M or 30M rows")
+    parser.add_argument("--rows", type=int, help="number of rows, instead of --size")
+    parser.add_argument("--extra-columns", type=int, default=40, help="flag and building columns added to the base columns")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per step, the best one counts")
+    parser.add_argument("--jobs", type=int, default=1, help="n_jobs passed to the preprocessing steps")
+    parser.add_argument("--no-memory", action="store_true", help="skip the traced run measuring peak memory")
+    parser.add_argument("--data", help="keep the generated CSV at this path and reuse it on later runs")
+    parser.add_argument("--baseline", default=baseline_file, help="json file with the baseline results")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown or memory growth (0.2 is 20%%)")
+    parser.add_argument("--update-baseline", action="store_true", help="save this run as the new baseline")
+    args = parser.parse_args()
+
+    rows = args.rows or sizes[args.size]
+    config = {"rows": rows, "extra_columns": args.extra_columns, "jobs": args.jobs}
+    directory = None
+    path = args.data
+    if path is None:
+        directory = tempfile.mkdtemp(prefix="banking_benchmark_")
+        path = os.path.join(directory, "application_train.csv")
+    try:
+        if not os.path.exists(path):
+            start = time.perf_counter()
+            generate_data(path, rows, args.extra_columns)
+            print(f"Generated {rows:,} rows in {time.perf_counter() - start:.1f}s ({os.path.getsize(path) / 1024**2:.0f} MB)")
+        results = run_benchmark(path, args.repeat, args.jobs, not args.no_memory)
+    finally:
+        if directory is not None:
+            shutil.rmtree(directory, ignore_errors=True)
+    print_results(results)
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"config": config, "results": results}, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline["config"] != config:
+            print(f"Baseline was measured with {baseline['config']}, not comparing")
+        else:
+            regressions = compare(results, baseline["results"], args.threshold)
+            for regression in regressions:
+                print("REGRESSION", regression)
+            if regressions:
+                raise SystemExit(1)
+            print(f"No regressions beyond {args.threshold:.0%} of the baseline")
+    else:
+        print(f"No baseline at {args.baseline} yet, save one with --update-baseline")
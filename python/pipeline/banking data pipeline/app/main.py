@@ -1,20 +1,46 @@
+import os
 import pandas as pd
 import numpy as np
 from utils import load_data as ld
 from utils import preprocessing as pp
+from utils.stage_cache import StageRunner
 
-df = ld.load_data('../data/raw/application_train.csv')
-print(df.shape)
+raw_file = '../data/raw/application_train.csv'
+dtype_plan_file = '../data/application_train.dtypes.json'
+imputer_file = '../data/application_train.imputer.json'
+cache_dir = '../data/cache'
+n_jobs = os.cpu_count() or 1  # processes for the column statistics of the fits
 
-# Optimize numeric dtypes
-optimized_df = pp.optimize_dataframe(df)
-print(optimized_df.shape)  # Should print the shape of the optimized DataFrame
+# Every stage is checkpointed under a key of its inputs, parameters and code,
+# a re-run only recomputes the stages downstream of what changed
+runner = StageRunner(cache_dir, max_bytes=4 * 1024**3)
+source = runner.source(raw_file)
 
-cleaned_df = pp.treat_nulls(optimized_df)
+# Reuse the dtype plan fitted on an earlier run, the loader then produces optimized dtypes directly
+plan = pp.load_dtype_plan(dtype_plan_file) if os.path.exists(dtype_plan_file) else None
+loaded = runner.run("load", ld.load_data, source, dtype_plan=plan)
+
+# Optimize numeric dtypes, fitting the plan when there is none yet or the file no longer fits it
+# (a cached load was computed with this same plan, only a fresh load can have rejected it)
+if plan is None or (loaded.loaded and loaded.value.attrs.get("dtype_plan_rejected")):
+    plan = pp.fit_dtype_plan(loaded.value, n_jobs=n_jobs)
+    pp.save_dtype_plan(plan, dtype_plan_file)
+optimized = runner.run("optimize", pp.optimize_dataframe, loaded, plan=plan)
+
+# Null treatment statistics are fitted once and reused, so every file gets the same fills
+if os.path.exists(imputer_file):
+    imputer = pp.NullImputer.load(imputer_file)
+else:
+    imputer = pp.NullImputer().fit(optimized.value, n_jobs=n_jobs)
+    imputer.save(imputer_file)
+cleaned = runner.run("treat_nulls", pp.treat_nulls, optimized, imputer=imputer)
+cleaned_df = cleaned.value
 print(cleaned_df.shape)  
 
-outliers = pp.find_outliers_iqr(cleaned_df,['AMT_INCOME_TOTAL'])
-print(len(outliers))
+outliers = runner.run("outliers", pp.find_outliers_iqr, cleaned, cols=['AMT_INCOME_TOTAL']).value
+print(int(outliers['AMT_INCOME_TOTAL'].sum()))  # number of outlier rows
 
 #### visualizations
-pp.visualize_dataset(df)
\ No newline at end of file
+# on the loaded data, before null treatment, so the report still shows the missing values.
+# Written to files, drawn from a stratified sample, so it also runs on machines without a display
+pp.visualize_dataset(loaded.value, output_dir='../reports/eda', stratify_by='TARGET', max_workers=4)
\ No newline at end of file
@@ -1,10 +1,147 @@
+from functools import reduce
+import numpy as np
 import pandas as pd
 
-def load_data(filepath):
+def reader_dtypes(dtype_plan):
+    # the CSV parser cannot produce float16, those columns are read as float32 and cast afterwards.
+    # Planned integers are left to the parser's default width: it wraps values that do not fit
+    # a small integer dtype without an error, check_plan() range checks them per chunk instead
+    if not dtype_plan:
+        return None
+    dtypes = {}
+    for col, dtype in dtype_plan.items():
+        dtype = pd.api.types.pandas_dtype(dtype)
+        if pd.api.types.is_integer_dtype(dtype):
+            continue
+        dtypes[col] = "float32" if dtype == np.float16 else dtype
+    return dtypes or None
+
+def check_plan(chunk: pd.DataFrame, targets: dict) -> None:
+    """
+    Raise a ValueError when a chunk does not fit its planned numbers: a null where
+    the plan has a non-nullable integer, a fraction, or a value outside the dtype's range.
+    """
+    for col, dtype in targets.items():
+        dtype = pd.api.types.pandas_dtype(dtype)
+        if dtype == np.float16:
+            # float16 overflows to inf without an error
+            if chunk[col].abs().max() > np.finfo(np.float16).max:
+                raise ValueError(f"{col} has values outside float16")
+            continue
+        if not pd.api.types.is_integer_dtype(dtype):
+            continue
+        values = chunk[col]
+        if not pd.api.types.is_numeric_dtype(values.dtype) or pd.api.types.is_bool_dtype(values.dtype):
+            raise ValueError(f"{col} is not numeric, the plan has {dtype}")
+        if values.hasnans and isinstance(dtype, np.dtype):
+            raise ValueError(f"{col} has nulls, the plan has {dtype}")
+        if pd.api.types.is_float_dtype(values.dtype) and (values.dropna() % 1 != 0).any():
+            raise ValueError(f"{col} has fractions, the plan has {dtype}")
+        info = np.iinfo(dtype.numpy_dtype if hasattr(dtype, "numpy_dtype") else dtype)
+        if values.count() and (values.min() < info.min or values.max() > info.max):
+            raise ValueError(f"{col} has values from {values.min()} to {values.max()}, outside {dtype}")
+
+def downcast_chunk(chunk: pd.DataFrame, dtype_plan=None, string_dtype="category") -> pd.DataFrame:
+    """
+    Shrink the columns of one chunk in a single astype:
+      - Columns in dtype_plan → the planned dtype
+      - Other integers → int8 / int16 / int32 from the chunk's min and max
+      - Other floats   → float32
+      - Other strings  → string_dtype ("category", "string[pyarrow]", or None to keep objects)
+    """
+    planned = dtype_plan or {}
+    targets = {col: dtype for col, dtype in planned.items() if col in chunk.columns}
+    check_plan(chunk, targets)
+
+    ints = chunk.select_dtypes(include="integer").drop(columns=list(targets), errors="ignore")
+    if not ints.empty:
+        mins, maxs = ints.min(), ints.max()
+        for col in ints.columns:
+            for dtype in (np.int8, np.int16, np.int32):
+                if mins[col] >= np.iinfo(dtype).min and maxs[col] <= np.iinfo(dtype).max:
+                    targets[col] = dtype
+                    break
+
+    for col in chunk.select_dtypes(include="float").columns:
+        if col not in planned:
+            targets[col] = np.float32
+
+    if string_dtype is not None:
+        for col in chunk.select_dtypes(include="object").columns:
+            if col not in planned:
+                targets[col] = string_dtype
+
+    targets = {col: dtype for col, dtype in targets.items() if chunk[col].dtype != dtype}
+    return chunk.astype(targets) if targets else chunk
+
+def unify_categories(chunks):
+    """
+    Give every categorical column the same categories in all chunks, so the
+    concatenated column stays categorical instead of falling back to objects.
+    Only the integer codes are remapped. A string column that is all null in a
+    chunk was parsed as floats there, it gets the categorical dtype too.
+    """
+    if not chunks:
+        return chunks
+    cat_cols = list(dict.fromkeys(col for chunk in chunks for col in chunk.columns
+                                  if isinstance(chunk[col].dtype, pd.CategoricalDtype)))
+    for col in cat_cols:
+        categorical = [isinstance(chunk[col].dtype, pd.CategoricalDtype) for chunk in chunks]
+        categories = reduce(lambda a, b: a.union(b), (chunk[col].cat.categories for chunk, is_cat in zip(chunks, categorical) if is_cat))
+        for chunk, is_cat in zip(chunks, categorical):
+            if is_cat:
+                if not chunk[col].cat.categories.equals(categories):
+                    chunk[col] = chunk[col].cat.set_categories(categories)
+            elif chunk[col].isna().all():
+                chunk[col] = chunk[col].astype(pd.CategoricalDtype(categories))
+    return chunks
+
+def iter_chunks(filepath, chunksize=100_000, usecols=None, dtype_plan=None, row_filter=None, string_dtype="category"):
+    """
+    Yield the downcast chunks of a CSV one at a time (same options as load_data),
+    for steps that stream over files too large to hold in memory.
+    """
+    with pd.read_csv(filepath, chunksize=chunksize, usecols=usecols, dtype=reader_dtypes(dtype_plan)) as reader:
+        for chunk in reader:
+            if row_filter is not None:
+                chunk = chunk.query(row_filter) if isinstance(row_filter, str) else chunk[row_filter(chunk)]
+            yield downcast_chunk(chunk, dtype_plan, string_dtype)
+
+def load_data(filepath, chunksize=100_000, usecols=None, dtype_plan=None, row_filter=None, string_dtype="category"):
+    """
+    Load a CSV chunk by chunk, shrinking every chunk before it is kept:
+      - usecols: only these columns are parsed
+      - dtype_plan: column -> dtype, given to the parser and applied to each chunk
+      - other numeric columns are downcast per chunk (see downcast_chunk)
+      - string columns become string_dtype, categorical by default, with the
+        categories of all chunks merged
+      - row_filter: a callable returning a boolean mask for a chunk, or a query
+        string, applied before the chunk is kept
+    Only the compact chunks are concatenated, so the full-width float64/int64
+    frame never exists. Planned integers are parsed at full width and range checked
+    before they are cast. A file that does not fit dtype_plan (a null, a fraction or
+    a value out of range where the plan has integers) is loaded without the plan and
+    flagged with df.attrs["dtype_plan_rejected"], so the caller can refit it.
+    Returns None if loading fails.
+    """
     try:
-        df = pd.read_csv(filepath)
+        chunks = unify_categories(list(iter_chunks(filepath, chunksize, usecols, dtype_plan, row_filter, string_dtype)))
+        if not chunks:
+            return pd.read_csv(filepath, nrows=0, usecols=usecols)
+        df = pd.concat(chunks)
+
+        # a column with nulls in some chunks only comes back as float64 (int32 + float32),
+        # shrink it back to float32 unless the plan says otherwise
+        widened = [col for col in df.select_dtypes(include="float64").columns if col not in (dtype_plan or {})]
+        if widened:
+            df = df.astype({col: np.float32 for col in widened})
         return df
     except Exception as e:
+        if dtype_plan:
+            print(f"Data does not fit the dtype plan ({e}), loading without it")
+            df = load_data(filepath, chunksize, usecols, None, row_filter, string_dtype)
+            if df is not None:
+                df.attrs["dtype_plan_rejected"] = True
+            return df
         print(f"Error loading data: {e}")
-        return None  
-              
\ No newline at end of file
+        return None
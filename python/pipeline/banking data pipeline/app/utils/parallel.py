@@ -0,0 +1,85 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import warnings
+import numpy as np
+import pandas as pd
+
+# statistics a worker can compute per column, and the values each one returns
+STATS = {
+    "profile": ["min", "max", "has_nulls", "whole", "fits_float16"],
+    "median": ["median"],
+    "quartiles": [0.25, 0.75],
+}
+
+def column_worker(task) -> None:
+    """
+    Compute one statistic for columns start:stop of the shared block and write it
+    into the shared output at offset + start. Runs in a worker process, only names
+    and shapes are pickled.
+    """
+    block_name, shape, out_name, out_shape, offset, start, stop, stat = task
+    block_shm = shared_memory.SharedMemory(name=block_name)
+    out_shm = shared_memory.SharedMemory(name=out_name)
+    try:
+        block = np.ndarray(shape, dtype=np.float64, buffer=block_shm.buf)[start:stop]
+        out = np.ndarray(out_shape, dtype=np.float64, buffer=out_shm.buf)[offset:]
+        with np.errstate(all="ignore"), warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=RuntimeWarning)  # all-null columns
+            if stat == "profile":
+                nulls = np.isnan(block)
+                out[start:stop, 0] = np.where(nulls, np.inf, block).min(axis=1)
+                out[start:stop, 1] = np.where(nulls, -np.inf, block).max(axis=1)
+                out[start:stop, 2] = nulls.any(axis=1)
+                out[start:stop, 3] = ((block == np.floor(block)) | nulls).all(axis=1)
+                out[start:stop, 4] = np.isclose(block, block.astype(np.float16), rtol=1e-03, atol=1e-06,
+                                                equal_nan=True).all(axis=1)
+            elif stat == "median":
+                out[start:stop, 0] = np.nanmedian(block, axis=1) if block.shape[1] else np.nan
+            else:
+                out[start:stop] = np.nanquantile(block, STATS[stat], axis=1).T if block.shape[1] else np.nan
+        del block, out
+    finally:
+        block_shm.close()
+        out_shm.close()
+
+def column_stats(df: pd.DataFrame, stat: str, n_jobs: int, cols=None,
+                 max_bytes: int = 256 * 1024**2) -> pd.DataFrame:
+    """
+    One statistic (see STATS) for every column of df, computed column-partitioned
+    on n_jobs processes:
+      - the columns go through a shared-memory float64 block of at most max_bytes,
+        as many columns at a time as fit, one contiguous row per column, which the
+        workers map instead of unpickling; the float64 copy of the whole frame never exists
+      - every worker writes its columns' results straight into a shared output array
+    Returns a DataFrame indexed by column, one column per returned value.
+    """
+    cols = list(df.columns if cols is None else cols)
+    batch = max(1, min(len(cols), max_bytes // max(1, len(df) * 8)))
+    out_shape = (len(cols), len(STATS[stat]))
+    block_shm = shared_memory.SharedMemory(create=True, size=max(1, batch * len(df) * 8))
+    out_shm = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(out_shape)) * 8))
+    try:
+        out = np.ndarray(out_shape, dtype=np.float64, buffer=out_shm.buf)
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            for first in range(0, len(cols), batch):
+                names = cols[first:first + batch]
+                shape = (len(names), len(df))
+                block = np.ndarray(shape, dtype=np.float64, buffer=block_shm.buf)
+                for i, col in enumerate(names):
+                    block[i] = df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+
+                # a few more parts than processes, so uneven columns still keep every core busy
+                bounds = np.linspace(0, len(names), min(len(names), n_jobs * 4) + 1).astype(int)
+                tasks = [(block_shm.name, shape, out_shm.name, out_shape, first, start, stop, stat)
+                         for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+                list(pool.map(column_worker, tasks))
+                del block
+
+        result = pd.DataFrame(out.copy(), index=cols, columns=STATS[stat])
+        del out
+    finally:
+        block_shm.close()
+        block_shm.unlink()
+        out_shm.close()
+        out_shm.unlink()
+    return result
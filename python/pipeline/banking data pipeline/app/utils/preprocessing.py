@@ -1,125 +1,345 @@
+import json
+import warnings
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
+from utils.quantile_sketch import KLLSketch
+from utils.report import build_report, column_types
+from utils.parallel import column_stats
+from utils import correlation as cr
 
-def optimize_dataframe(df: pd.DataFrame) -> pd.DataFrame:
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+INT_TYPES = [np.uint8, np.int8, np.uint16, np.int16, np.uint32, np.int32, np.uint64, np.int64]
+
+def numeric_profile(df: pd.DataFrame, block_rows: int = 262_144, n_jobs: int = 1) -> pd.DataFrame:
+    """
+    Profile every numeric column in one vectorized pass, dtype group by dtype
+    group and block of rows by block of rows (no per-column loop):
+      - min / max ignoring nulls
+      - has_nulls
+      - whole: every non-null value is a whole number
+      - fits_float16: every value survives a float16 round trip (rtol 1e-3)
+    With n_jobs > 1 the columns are split across processes (see parallel.column_stats).
+    Returns a DataFrame indexed by column name.
     """
-    Optimize numeric dtypes:
-      - Integers → int8 / int16 / int32
+    num = df.select_dtypes(include="number")
+    if n_jobs > 1 and len(num.columns) > 1:
+        profile = column_stats(num, "profile", n_jobs)
+        return profile.astype({"has_nulls": bool, "whole": bool, "fits_float16": bool})
+    groups = {}
+    for col, dtype in num.dtypes.items():
+        groups.setdefault(dtype, []).append(col)
+
+    profiles = []
+    for dtype, cols in groups.items():
+        mins = np.full(len(cols), np.inf)
+        maxs = np.full(len(cols), -np.inf)
+        has_nulls = np.zeros(len(cols), dtype=bool)
+        whole = np.ones(len(cols), dtype=bool)
+        fits_float16 = np.ones(len(cols), dtype=bool)
+        for start in range(0, max(len(num), 1), block_rows):
+            block = num.iloc[start:start + block_rows][cols].to_numpy(dtype=np.float64, na_value=np.nan)
+            if block.size == 0:
+                continue
+            nulls = np.isnan(block)
+            has_nulls |= nulls.any(axis=0)
+            with np.errstate(all="ignore"):
+                mins = np.fmin(mins, np.nanmin(np.where(nulls, np.inf, block), axis=0))
+                maxs = np.fmax(maxs, np.nanmax(np.where(nulls, -np.inf, block), axis=0))
+                if not pd.api.types.is_integer_dtype(dtype):
+                    whole &= ((block == np.floor(block)) | nulls).all(axis=0)
+                    fits_float16 &= np.isclose(block, block.astype(np.float16), rtol=1e-03, atol=1e-06,
+                                               equal_nan=True).all(axis=0)
+        profiles.append(pd.DataFrame({"min": mins, "max": maxs, "has_nulls": has_nulls,
+                                      "whole": whole, "fits_float16": fits_float16}, index=cols))
+
+    if not profiles:
+        return pd.DataFrame(columns=["min", "max", "has_nulls", "whole", "fits_float16"])
+    return pd.concat(profiles).loc[num.columns]
+
+def fit_dtype_plan(df: pd.DataFrame, nullable_ints: bool = True, float16: bool = True, n_jobs: int = 1,
+                   max_category_ratio: float = 0.5) -> dict:
+    """
+    Fit a dtype plan (column -> dtype name):
+      - Integers → the smallest of uint8 / int8 / uint16 / int16 / uint32 / int32 / uint64 / int64
+        (nullable UInt* / Int* when the column has nulls and nullable_ints is on)
+      - Floats → float16 when every value survives the round trip, else float32.
+        Floats stay floats even when they hold only whole numbers: the plan is
+        reused on later files, where a fraction or a null must still load
+      - Strings → category when at most max_category_ratio of the values are
+        distinct, else Arrow strings (when pyarrow is installed)
+    The plan can be saved with save_dtype_plan() and handed to load_data(), so
+    later loads of the same feed come out optimized without refitting.
+    """
+    plan = {}
+    for col, p in numeric_profile(df, n_jobs=n_jobs).iterrows():
+        is_int = pd.api.types.is_integer_dtype(df[col].dtype)
+        if is_int and (not p["has_nulls"] or nullable_ints) and np.isfinite(p["min"]):
+            for dtype in INT_TYPES:
+                info = np.iinfo(dtype)
+                if p["min"] >= info.min and p["max"] <= info.max:
+                    name = np.dtype(dtype).name
+                    plan[col] = name.capitalize().replace("Ui", "UI") if p["has_nulls"] else name
+                    break
+        elif not is_int:
+            plan[col] = "float16" if float16 and p["fits_float16"] else "float32"
+
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            plan[col] = "category"
+        elif df[col].dtype == "object" or pd.api.types.is_string_dtype(df[col].dtype):
+            if df[col].nunique() <= max_category_ratio * max(df[col].count(), 1):
+                plan[col] = "category"
+            elif pa is not None:
+                plan[col] = "string[pyarrow]"
+    return plan
+
+def save_dtype_plan(plan: dict, path: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({col: str(dtype) for col, dtype in plan.items()}, f, indent=2)
+
+def load_dtype_plan(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def optimize_dataframe(df: pd.DataFrame, plan: dict = None, n_jobs: int = 1) -> pd.DataFrame:
+    """
+    Optimize numeric dtypes with a dtype plan (see fit_dtype_plan):
+      - Integers → uint8 / int8 / uint16 / int16 / uint32 / int32, nullable when needed
       - Floats   → float16 / float32
-    Returns a DataFrame with reduced memory usage.
+      - Strings  → category / Arrow strings
+    The plan is fitted on df (on n_jobs processes) when none is given. Columns the plan leaves alone
+    are not copied. Returns a DataFrame with reduced memory usage.
     """
     before = df.memory_usage(deep=True).sum() / 1024**2
-    optimized = df.copy()
-
-    for col in optimized.columns:
-        s = optimized[col]
-
-        # --- Integers ---
-        if pd.api.types.is_integer_dtype(s):
-            vals = s.astype("int64")  # safe for bound checks
-            if vals.min() >= np.iinfo(np.int8).min and vals.max() <= np.iinfo(np.int8).max:
-                optimized[col] = s.astype("int8")
-            elif vals.min() >= np.iinfo(np.int16).min and vals.max() <= np.iinfo(np.int16).max:
-                optimized[col] = s.astype("int16")
-            elif vals.min() >= np.iinfo(np.int32).min and vals.max() <= np.iinfo(np.int32).max:
-                optimized[col] = s.astype("int32")
-            # else: leave unchanged if too large
-
-        # --- Floats ---
-        elif pd.api.types.is_float_dtype(s):
-            s64 = s.astype("float64")
-            if np.allclose(s64, s64.astype("float16"), rtol=1e-03, atol=1e-06, equal_nan=True):
-                optimized[col] = s64.astype("float16")
-            else:
-                optimized[col] = s64.astype("float32")
+    if plan is None:
+        plan = fit_dtype_plan(df, n_jobs=n_jobs)
+    plan = {col: dtype for col, dtype in plan.items() if col in df.columns and str(df[col].dtype) != str(dtype)}
+    optimized = df.astype(plan, copy=False) if plan else df
 
     after = optimized.memory_usage(deep=True).sum() / 1024**2
     print(f"Memory: {before:.3f} MB → {after:.3f} MB ({(before - after) / before * 100:.2f}% reduction)")
 
     return optimized
 
-def treat_nulls(df: pd.DataFrame) -> pd.DataFrame:
+class NullImputer:
+    """
+    Null treatment split into fit and transform, so the statistics fitted on the
+    training file are applied unchanged to test and daily scoring files:
+      - fit: columns with more than threshold nulls are marked for dropping,
+        numeric medians come from one block-wise nanmedian per dtype group,
+        categorical modes from counting category codes
+      - transform: drops those columns and fills every remaining column with a
+        single fillna dict, datetime columns get forward fill, then backward fill;
+        it returns one copy of the frame, or none with inplace=True
+      - save / load: the fitted statistics as JSON
+    """
+
+    def __init__(self, threshold: float = 0.6, block_columns: int = 32):
+        self.threshold = threshold
+        self.block_columns = block_columns
+        self.dropped_columns = []
+        self.filled_numeric = {}
+        self.filled_categorical = {}
+        self.timeseries_fill = []
+
+    def fit(self, df: pd.DataFrame, n_jobs: int = 1) -> "NullImputer":
+        null_ratio = df.isna().mean()
+        self.dropped_columns = null_ratio[null_ratio > self.threshold].index.tolist()
+        kept = df.columns.difference(self.dropped_columns, sort=False)
+
+        # Numeric: medians of block_columns columns at a time, float64 so float16 columns stay exact
+        num_cols = [c for c in kept if pd.api.types.is_numeric_dtype(df[c]) and not pd.api.types.is_bool_dtype(df[c])]
+        self.filled_numeric = {}
+        if n_jobs > 1 and len(num_cols) > 1:
+            # columns split across n_jobs processes instead of blocks in this one
+            blocks = [(num_cols, column_stats(df, "median", n_jobs, num_cols)["median"].to_numpy())]
+        else:
+            blocks = []
+            for start in range(0, len(num_cols), self.block_columns):
+                cols = num_cols[start:start + self.block_columns]
+                block = df[cols].to_numpy(dtype=np.float64, na_value=np.nan)
+                with warnings.catch_warnings():
+                    warnings.simplefilter("ignore", category=RuntimeWarning)  # all-null columns
+                    blocks.append((cols, np.nanmedian(block, axis=0)))
+        for cols, medians in blocks:
+            for col, median in zip(cols, medians):
+                if np.isnan(median):
+                    continue
+                # an integer column must stay integer, round its median
+                if pd.api.types.is_integer_dtype(df[col]):
+                    self.filled_numeric[col] = int(np.round(median))
+                else:
+                    self.filled_numeric[col] = float(median)
+
+        # Datetime: nothing to fit, filled from neighbouring rows
+        self.timeseries_fill = [c for c in kept if pd.api.types.is_datetime64_any_dtype(df[c])]
+
+        # Categorical / object: the most frequent code, ties go to the smallest value like Series.mode
+        self.filled_categorical = {}
+        for col in kept:
+            if col in self.timeseries_fill or (col in num_cols):
+                continue
+            if isinstance(df[col].dtype, pd.CategoricalDtype):
+                codes, uniques = df[col].cat.codes.to_numpy(), df[col].cat.categories
+            else:
+                codes, uniques = pd.factorize(df[col], sort=True)
+            counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+            mode = uniques[counts.argmax()] if counts.any() else ""
+            self.filled_categorical[col] = mode.item() if isinstance(mode, np.generic) else mode
+        return self
+
+    def transform(self, df: pd.DataFrame, inplace: bool = False) -> pd.DataFrame:
+        """
+        Apply the fitted statistics. df is left as it is and the result is one copy
+        of it (made by the drop). With inplace=True the columns are dropped and
+        filled in df itself, which is returned, and the frame is never copied.
+        """
+        dropped = [c for c in self.dropped_columns if c in df.columns]
+        if inplace:
+            # deleting a column splits its block into views, the other columns are not copied
+            for col in dropped:
+                del df[col]
+            cleaned = df
+        else:
+            cleaned = df.drop(columns=dropped)
+        fills = {col: value for col, value in {**self.filled_numeric, **self.filled_categorical}.items()
+                 if col in cleaned.columns}
+        # a categorical column can only be filled with one of its categories
+        for col, value in fills.items():
+            if isinstance(cleaned[col].dtype, pd.CategoricalDtype) and value not in cleaned[col].cat.categories:
+                cleaned[col] = cleaned[col].cat.add_categories([value])
+        # cleaned is df itself or the copy drop() made, either way filled without another copy
+        cleaned.fillna(fills, inplace=True)
+        dates = [c for c in self.timeseries_fill if c in cleaned.columns and cleaned[c].isna().any()]
+        if dates:
+            cleaned[dates] = cleaned[dates].ffill().bfill()
+        return cleaned
+
+    def fit_transform(self, df: pd.DataFrame) -> pd.DataFrame:
+        return self.fit(df).transform(df)
+
+    def save(self, path: str) -> None:
+        state = {
+            "threshold": self.threshold,
+            "dropped_columns": self.dropped_columns,
+            "filled_numeric": self.filled_numeric,
+            "filled_categorical": self.filled_categorical,
+            "timeseries_fill": self.timeseries_fill,
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=2, default=str)
+
+    @classmethod
+    def load(cls, path: str) -> "NullImputer":
+        with open(path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        imputer = cls(threshold=state["threshold"])
+        imputer.dropped_columns = state["dropped_columns"]
+        imputer.filled_numeric = state["filled_numeric"]
+        imputer.filled_categorical = state["filled_categorical"]
+        imputer.timeseries_fill = state["timeseries_fill"]
+        return imputer
+
+def treat_nulls(df: pd.DataFrame, imputer: NullImputer = None, n_jobs: int = 1) -> pd.DataFrame:
     """
     Treat null values in the DataFrame:
-      - Drop columns with >30% nulls
+      - Drop columns with >60% nulls
       - Fill numeric columns with median
       - Fill categorical/object columns with mode
       - Fill datetime columns with forward fill, then backward fill
-    Returns a cleaned DataFrame.
-    """
-    cleaned = df.copy()
-
-    # 1. Drop columns with >60% nulls
-    threshold = 0.6
-    null_ratio = cleaned.isna().mean()
-    to_drop = null_ratio[null_ratio > threshold].index
-    cleaned = cleaned.drop(columns=to_drop)
-    # Dict = {
-    #     "threshold": threshold,
-    #     "dropped_columns": [],
-    #     "filled_numeric": {},
-    #     "filled_categorical": {},
-    #     "timeseries_fill": timeseries_fill,
-    #     "time_used": None
-    # }
-
-    # 2. Handle remaining nulls
-    for col in cleaned.columns:
-        if cleaned[col].isna().any():
-            # Numeric columns
-            if pd.api.types.is_numeric_dtype(cleaned[col]):
-                median_val = cleaned[col].median()
-                cleaned[col] = cleaned[col].fillna(median_val)
-
-            # Datetime columns
-            elif pd.api.types.is_datetime64_any_dtype(cleaned[col]):
-                cleaned[col] = cleaned[col].fillna(method="ffill").fillna(method="bfill")
-
-            # Categorical / Object columns
-            else:
-                mode_val = cleaned[col].mode(dropna=True)
-                if not mode_val.empty:
-                    cleaned[col] = cleaned[col].fillna(mode_val[0])
-                else:
-                    cleaned[col] = cleaned[col].fillna("")
+    A fitted imputer (see NullImputer) is applied as is, otherwise one is fitted on df
+    (on n_jobs processes). Returns a cleaned DataFrame.
+    """
+    if imputer is None:
+        imputer = NullImputer().fit(df, n_jobs=n_jobs)
+    return imputer.transform(df)
 
-    return cleaned
+def outlier_masks(df: pd.DataFrame, bounds: pd.DataFrame, as_positions: bool = False) -> dict:
+    """
+    Flag the values of df outside bounds (a DataFrame with lower / upper per column),
+    compared for all columns at once. Returns column -> boolean mask, or row positions
+    (np.flatnonzero of the mask) when as_positions is True.
+    """
+    cols = bounds.index.tolist()
+    values = df[cols].to_numpy(dtype=np.float64, na_value=np.nan)
+    masks = (values < bounds["lower"].to_numpy()) | (values > bounds["upper"].to_numpy())
+    if as_positions:
+        return {col: np.flatnonzero(masks[:, i]) for i, col in enumerate(cols)}
+    return {col: masks[:, i] for i, col in enumerate(cols)}
+
+def iqr_bounds(q1: pd.Series, q3: pd.Series) -> pd.DataFrame:
+    iqr = q3 - q1
+    return pd.DataFrame({"q1": q1, "q3": q3, "lower": q1 - 1.5 * iqr, "upper": q3 + 1.5 * iqr})
 
-def find_outliers_iqr(df: pd.DataFrame, cols=None) -> dict:
+def find_outliers_iqr(df: pd.DataFrame, cols=None, as_positions: bool = False, n_jobs: int = 1) -> dict:
     """
     Detect outliers in numeric columns using IQR method.
-    Returns a dictionary of column -> list of outlier indices.
+    Both quartiles of every column come from a single quantile call,
+    or with n_jobs > 1 from columns split across processes.
+    Returns a dictionary of column -> boolean mask over the rows
+    (row positions instead when as_positions is True).
     """
     if cols is None:
         cols = df.select_dtypes(include=np.number).columns
 
-    outliers = {}
-    for col in cols:
-        Q1 = df[col].quantile(0.25)
-        Q3 = df[col].quantile(0.75)
-        IQR = Q3 - Q1
-        lower = Q1 - 1.5 * IQR
-        upper = Q3 + 1.5 * IQR
-        mask = (df[col] < lower) | (df[col] > upper)
-        outliers[col] = df[mask].index.tolist()
-    return outliers
+    if n_jobs > 1 and len(cols) > 1:
+        quartiles = column_stats(df, "quartiles", n_jobs, cols).T
+    else:
+        quartiles = df[list(cols)].quantile([0.25, 0.75])
+    bounds = iqr_bounds(quartiles.loc[0.25], quartiles.loc[0.75])
+    return outlier_masks(df, bounds, as_positions)
+
+def fit_iqr_bounds(chunks, cols=None, k: int = 200) -> pd.DataFrame:
+    """
+    IQR bounds over data streamed chunk by chunk (e.g. iter_chunks over a year of
+    monthly files), with one KLLSketch per column instead of a full sort. Quartiles
+    are approximate, within about 1% in rank for the default k.
+    Returns a DataFrame of q1 / q3 / lower / upper per column.
+    """
+    sketches = {}
+    for chunk in chunks:
+        if cols is None:
+            cols = chunk.select_dtypes(include=np.number).columns.tolist()
+        for col in cols:
+            sketches.setdefault(col, KLLSketch(k)).update(chunk[col].to_numpy(dtype=np.float64, na_value=np.nan))
+
+    quartiles = pd.DataFrame({col: sketch.quantile([0.25, 0.75]) for col, sketch in sketches.items()},
+                             index=[0.25, 0.75])
+    return iqr_bounds(quartiles.loc[0.25], quartiles.loc[0.75])
 
-def visualize_dataset(df: pd.DataFrame) -> None:
+def flag_outliers(chunks, bounds: pd.DataFrame, as_positions: bool = False):
+    """
+    Second pass over the chunks: yields (chunk index, outlier masks) per chunk,
+    masks as in find_outliers_iqr, using bounds from fit_iqr_bounds.
+    """
+    for chunk in chunks:
+        yield chunk.index, outlier_masks(chunk, bounds, as_positions)
+
+def visualize_dataset(df: pd.DataFrame, output_dir: str = None, top_k: int = 20, **report_options):
     """
     Automatically generate common EDA visualizations from a DataFrame.
     - Numeric columns: histogram, boxplot, violin plot
     - Categorical columns: countplot
-    - Numeric vs numeric: scatter, correlation heatmap, pairplot
+    - Numeric vs numeric: correlation heatmap, scatter for the top_k most correlated pairs
     - Numeric vs categorical: boxplot
     - Categorical vs categorical: crosstab heatmap
+    With output_dir the figures are written headlessly to files instead of shown,
+    sampled and limited to the strongest pairs (see report.build_report, which
+    takes report_options), and the path of the HTML report is returned.
     """
+    if output_dir is not None:
+        return build_report(df, output_dir, top_k_pairs=top_k, **report_options)
+
     sns.set(style="whitegrid", palette="Set2")
 
     # Identify column types
-    num_cols = df.select_dtypes(include=["number"]).columns.tolist()
-    cat_cols = [c for c in df.columns if df[c].dtype == "object" or df[c].nunique() <= 20]
+    num_cols, cat_cols = column_types(df)
 
     # --- Summary ---
     print("Shape:", df.shape)
@@ -152,19 +372,18 @@ def visualize_dataset(df: pd.DataFrame) -> None:
     # --- Correlation Heatmap ---
     if len(num_cols) > 1:
         plt.figure(figsize=(10, 6))
-        corr = df[num_cols].corr()
-        sns.heatmap(corr, annot=True, cmap="coolwarm", fmt=".2f")
+        corr = cr.correlation(df, num_cols)
+        sns.heatmap(corr, annot=len(num_cols) <= 20, cmap="coolwarm", fmt=".2f")
         plt.title("Correlation Heatmap")
         plt.show()
 
-    # --- Scatterplots (Numeric vs Numeric) ---
+    # --- Scatterplots (Numeric vs Numeric), the most correlated pairs only ---
     if len(num_cols) >= 2:
-        for i in range(len(num_cols)):
-            for j in range(i+1, len(num_cols)):
-                plt.figure(figsize=(6, 4))
-                sns.scatterplot(x=df[num_cols[i]], y=df[num_cols[j]])
-                plt.title(f"Scatter: {num_cols[i]} vs {num_cols[j]}")
-                plt.show()
+        for a, b, r in cr.top_k_pairs(corr, top_k).itertuples(index=False):
+            plt.figure(figsize=(6, 4))
+            sns.scatterplot(x=df[a], y=df[b])
+            plt.title(f"Scatter: {a} vs {b} (r = {r:.2f})")
+            plt.show()
 
     # --- Numeric vs Categorical ---
     for cat in cat_cols:
@@ -0,0 +1,77 @@
+import numpy as np
+
+class KLLSketch:
+    """
+    Streaming approximate quantiles in the style of the KLL sketch:
+      - values go into level 0, a level holding more than its capacity is sorted
+        and every other item (random offset) moves up one level with twice the weight
+      - capacities shrink by 2/3 per level below the top, so memory stays around
+        3 * k values however many values are added
+      - sketches of different chunks or files can be merged
+    The rank error is roughly 1.7 / k of the number of values (k=200 → under 1%).
+    Nulls are ignored, like pandas' quantile.
+    """
+
+    def __init__(self, k: int = 200, seed: int = None):
+        self.k = k
+        self.n = 0
+        self.levels = [np.empty(0)]
+        self.rng = np.random.default_rng(seed)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - 1 - level
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self) -> None:
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                # an odd item out stays on this level, so the total weight is unchanged
+                keep = items[:1] if len(items) % 2 else items[:0]
+                pairs = items[len(keep):]
+                promoted = pairs[self.rng.integers(2)::2]
+                self.levels[level] = keep
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            level += 1
+
+    def update(self, values) -> "KLLSketch":
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if len(values):
+            self.levels[0] = np.concatenate([self.levels[0], values])
+            self.n += len(values)
+            self._compress()
+        return self
+
+    def merge(self, other: "KLLSketch") -> "KLLSketch":
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self._compress()
+        return self
+
+    def quantile(self, q):
+        """
+        Approximate quantile(s) q in [0, 1], a float for a single q, else an array.
+        NaN when no values were added.
+        """
+        qs = np.atleast_1d(np.asarray(q, dtype=np.float64))
+        items = np.concatenate(self.levels)
+        if not len(items):
+            result = np.full(len(qs), np.nan)
+        else:
+            weights = np.concatenate([np.full(len(level), 2.0 ** h) for h, level in enumerate(self.levels)])
+            order = np.argsort(items, kind="stable")
+            items, cumulative = items[order], np.cumsum(weights[order])
+            ranks = qs * cumulative[-1]
+            result = items[np.minimum(np.searchsorted(cumulative, ranks, side="left"), len(items) - 1)]
+        return float(result[0]) if np.ndim(q) == 0 else result
+
+    def __len__(self) -> int:
+        return self.n
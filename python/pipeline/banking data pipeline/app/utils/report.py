@@ -0,0 +1,180 @@
+import hashlib
+import html
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import seaborn as sns
+from matplotlib.figure import Figure
+from utils import correlation as cr
+
+REPORT_VERSION = 1  # bump to redraw every cached figure
+
+def stratified_sample(df: pd.DataFrame, n: int, by: str = None, seed: int = 0) -> pd.DataFrame:
+    """
+    At most n rows of df. With by (e.g. "TARGET") every group keeps its share of
+    the rows, so rare classes still show up in the plots.
+    """
+    if len(df) <= n:
+        return df
+    if by is None or by not in df.columns:
+        return df.sample(n=n, random_state=seed)
+    frac = n / len(df)
+    return df.groupby(by, observed=True, group_keys=False).sample(frac=frac, random_state=seed)
+
+def column_types(df: pd.DataFrame, max_categories: int = 20):
+    """
+    Numeric and categorical columns of df: string and categorical columns, and
+    columns with at most max_categories distinct values, are categorical.
+    Distinct values of categorical columns are counted on their codes.
+    """
+    num_cols = df.select_dtypes(include=["number"]).columns.tolist()
+    cat_cols = []
+    for c in df.columns:
+        if isinstance(df[c].dtype, pd.CategoricalDtype) or df[c].dtype == "object" or pd.api.types.is_string_dtype(df[c].dtype):
+            cat_cols.append(c)
+        elif df[c].nunique() <= max_categories:
+            cat_cols.append(c)
+    return num_cols, cat_cols
+
+def top_categorical_pairs(df: pd.DataFrame, cat_cols: list, num_cols: list, k: int) -> list:
+    """
+    The k categorical x numeric pairs where the categories explain most of the numeric
+    variance (correlation ratio eta²), as (cat, num, eta²).
+    """
+    pairs = []
+    total = df[num_cols].var(ddof=0)
+    for cat in cat_cols:
+        nums = [c for c in num_cols if c != cat]
+        if not nums:
+            continue
+        groups = df.groupby(cat, observed=True)[nums]
+        between = (groups.count() * (groups.mean() - df[nums].mean()) ** 2).sum() / df[nums].count()
+        eta = (between / total[nums]).replace([np.inf, -np.inf], np.nan)
+        pairs.extend((cat, num, value) for num, value in eta.items() if pd.notna(value))
+    return sorted(pairs, key=lambda pair: -pair[2])[:k]
+
+def figure_key(kind: str, data: pd.DataFrame, options: dict = None) -> str:
+    # hash of the plotted column data, so a figure is only redrawn when its data changes.
+    # Floats are hashed as float64 with one NaN: the bits of a float16 / float32 NaN differ
+    # between a freshly loaded frame and the same frame read back from the stage cache
+    digest = hashlib.sha1(f"{REPORT_VERSION}|{kind}|{sorted((options or {}).items())}".encode())
+    for col in data.columns:
+        values = data[col]
+        digest.update(f"|{col}|{values.dtype}|".encode())
+        if pd.api.types.is_float_dtype(values.dtype):
+            values = values.astype(np.float64)
+            values = values.where(values.notna(), np.nan)
+        digest.update(pd.util.hash_pandas_object(values, index=False).to_numpy().tobytes())
+    return digest.hexdigest()[:16]
+
+def render_figure(task: dict) -> str:
+    """
+    Draw one figure of the report and save it as a PNG. Figures are matplotlib Figure
+    objects, not pyplot ones, so no display is needed, also in worker processes.
+    """
+    kind, data, cols = task["kind"], task["data"], task["columns"]
+    if kind == "numeric":
+        fig = Figure(figsize=(16, 4))
+        axes = fig.subplots(1, 3)
+        sns.histplot(data[cols[0]].dropna(), bins=30, kde=True, ax=axes[0])
+        axes[0].set_title(f"Histogram + KDE: {cols[0]}")
+        sns.boxplot(x=data[cols[0]], ax=axes[1])
+        axes[1].set_title(f"Boxplot: {cols[0]}")
+        sns.violinplot(x=data[cols[0]], ax=axes[2])
+        axes[2].set_title(f"Violin Plot: {cols[0]}")
+    elif kind == "categorical":
+        fig = Figure(figsize=(8, 4))
+        ax = fig.subplots()
+        counts = data[cols[0]].value_counts()
+        counts = counts[counts > 0]  # categories missing from the sample
+        sns.countplot(x=data[cols[0]], order=counts.index, ax=ax)
+        ax.set_title(f"Count Plot: {cols[0]}")
+        ax.tick_params(axis="x", rotation=45)
+    elif kind == "heatmap":
+        fig = Figure(figsize=(max(10, len(cols) * 0.4), max(6, len(cols) * 0.3)))
+        ax = fig.subplots()
+        sns.heatmap(data, annot=len(cols) <= 20, cmap="coolwarm", fmt=".2f", ax=ax)
+        ax.set_title("Correlation Heatmap")
+    elif kind == "scatter":
+        fig = Figure(figsize=(6, 4))
+        ax = fig.subplots()
+        sns.scatterplot(x=data[cols[0]], y=data[cols[1]], s=8, alpha=0.5, ax=ax)
+        ax.set_title(f"Scatter: {cols[0]} vs {cols[1]}")
+    else:  # "bar", numeric by categorical
+        fig = Figure(figsize=(8, 4))
+        ax = fig.subplots()
+        sns.barplot(x=data[cols[0]], y=data[cols[1]], errorbar=None, ax=ax)
+        ax.set_title(f"{cols[1]} by {cols[0]}")
+        ax.tick_params(axis="x", rotation=45)
+    fig.tight_layout()
+    fig.savefig(task["path"], dpi=task.get("dpi", 80))
+    return task["path"]
+
+def safe_name(text: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", str(text))[:60]
+
+def build_report(df: pd.DataFrame, output_dir: str, sample_size: int = 50_000, stratify_by: str = None,
+                 max_figures: int = 200, top_k_pairs: int = 20, max_workers: int = None,
+                 seed: int = 0, dpi: int = 80) -> str:
+    """
+    Headless EDA report: the figures of visualize_dataset saved as PNGs under
+    output_dir plus an index.html with the summary tables, with the costs bounded:
+      - figures are drawn from a (stratified) sample of sample_size rows
+      - only the top_k_pairs most correlated numeric pairs get a scatter plot and
+        only the top_k_pairs strongest categorical x numeric pairs get a barplot
+      - at most max_figures figures, in the order heatmap, numeric columns,
+        categorical columns, scatter plots, barplots
+      - figures whose data did not change since the last run are not redrawn,
+        PNGs of figures no longer in the report are deleted
+      - rendering runs in a process pool of max_workers processes (1 = in process)
+    Returns the path of index.html.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    sample = stratified_sample(df, sample_size, stratify_by, seed)
+    num_cols, cat_cols = column_types(sample)
+
+    tasks = []
+    def add(kind, title, cols, data):
+        key = figure_key(kind, data, {"dpi": dpi})
+        path = os.path.join(output_dir, f"{kind}_{safe_name('_'.join(map(str, cols)))}_{key}.png")
+        tasks.append({"kind": kind, "title": title, "columns": cols, "data": data, "path": path, "dpi": dpi})
+
+    corr = cr.correlation(sample, num_cols) if len(num_cols) > 1 else None
+    if corr is not None:
+        add("heatmap", "Correlation Heatmap", num_cols, corr)
+    for col in num_cols:
+        add("numeric", f"Numeric: {col}", [col], sample[[col]])
+    for col in cat_cols:
+        add("categorical", f"Categorical: {col}", [col], sample[[col]])
+    if corr is not None:
+        for a, b, r in cr.top_k_pairs(corr, top_k_pairs).itertuples(index=False):
+            add("scatter", f"Scatter: {a} vs {b} (r = {r:.2f})", [a, b], sample[[a, b]])
+    for cat, num, eta in top_categorical_pairs(sample, cat_cols, num_cols, top_k_pairs):
+        add("bar", f"{num} by {cat} (eta² = {eta:.2f})", [cat, num], sample[[cat, num]])
+    tasks = tasks[:max_figures]
+
+    current = {os.path.basename(task["path"]) for task in tasks}
+    for name in os.listdir(output_dir):
+        if name.endswith(".png") and name not in current:
+            os.remove(os.path.join(output_dir, name))
+    pending = [task for task in tasks if not os.path.exists(task["path"])]
+    if max_workers == 1 or len(pending) <= 1:
+        for task in pending:
+            render_figure(task)
+    elif pending:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            list(pool.map(render_figure, pending, chunksize=4))
+    print(f"Report: {len(tasks)} figures, {len(pending)} rendered, {len(tasks) - len(pending)} cached")
+
+    index = os.path.join(output_dir, "index.html")
+    with open(index, "w", encoding="utf-8") as f:
+        f.write("<html><head><meta charset='utf-8'><title>EDA report</title></head><body>\n")
+        f.write(f"<h1>EDA report</h1><p>Shape: {df.shape}, figures drawn from {len(sample)} sampled rows</p>\n")
+        f.write("<h2>Missing Values</h2>\n" + df.isna().sum().to_frame("missing").to_html() + "\n")
+        f.write("<h2>Basic Statistics</h2>\n" + sample.describe(include="all").T.to_html() + "\n")
+        for task in tasks:
+            f.write(f"<h3>{html.escape(task['title'])}</h3><img src='{os.path.basename(task['path'])}'>\n")
+        f.write("</body></html>\n")
+    return index
@@ -0,0 +1,189 @@
+import hashlib
+import inspect
+import json
+import os
+import time
+import pandas as pd
+
+class StageResult:
+    """
+    Output of one pipeline stage: its cache key and its value, which is only
+    read from the cache when something asks for it (.value).
+    """
+
+    def __init__(self, name: str, key: str, load=None, value=None):
+        self.name = name
+        self.key = key
+        self._load = load
+        self._value = value
+        self.loaded = load is None
+
+    @property
+    def value(self):
+        if not self.loaded:
+            self._value = self._load()
+            self.loaded = True
+        return self._value
+
+def file_key(path: str, block_size: int = 1 << 20) -> str:
+    """sha1 of a file's content, read block by block."""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def source_of(obj) -> str:
+    try:
+        return inspect.getsource(obj)
+    except (OSError, TypeError):
+        return getattr(obj, "__qualname__", repr(obj))
+
+def code_of(obj) -> str:
+    """
+    The code a stage depends on: the source of the module defining obj and of the
+    modules next to it (utils/*) that it uses, so editing a helper such as
+    iqr_bounds also changes the key of find_outliers_iqr.
+    """
+    module = inspect.getmodule(obj)
+    if module is None or not getattr(module, "__file__", None):
+        return source_of(obj)
+    package_dir = os.path.dirname(os.path.abspath(module.__file__))
+    sources, seen, pending = {}, set(), [module]
+    while pending:
+        module = pending.pop()
+        if module.__name__ in seen:
+            continue
+        seen.add(module.__name__)
+        sources[module.__name__] = source_of(module)
+        for value in vars(module).values():
+            if not (inspect.ismodule(value) or inspect.isfunction(value) or inspect.isclass(value)):
+                continue
+            dependency = value if inspect.ismodule(value) else inspect.getmodule(value)
+            path = getattr(dependency, "__file__", None)
+            if path and os.path.dirname(os.path.abspath(path)) == package_dir:
+                pending.append(dependency)
+    return "".join(f"{name}\n{sources[name]}" for name in sorted(sources))
+
+def param_token(value) -> str:
+    """A stable text for one stage argument, part of the stage key."""
+    if isinstance(value, StageResult):
+        return f"stage:{value.key}"
+    if isinstance(value, pd.DataFrame):
+        return "frame:" + hashlib.sha1(pd.util.hash_pandas_object(value).to_numpy().tobytes()).hexdigest()
+    if isinstance(value, (dict, list, tuple, str, int, float, bool, type(None))):
+        return json.dumps(value, sort_keys=True, default=str)
+    # objects such as a fitted NullImputer: their state and the code of their class
+    state = json.dumps(getattr(value, "__dict__", repr(value)), sort_keys=True, default=str)
+    return f"{type(value).__qualname__}:{state}:{code_of(type(value))}"
+
+class StageRunner:
+    """
+    Checkpoint cache for the stages of the pipeline (load → optimize → treat nulls → outliers):
+      - a stage's key is the sha1 of its name, the keys of its input stages (or the
+        content hash of the input file), its other parameters and the source of its
+        function's module and the utils modules that module uses (code_of)
+      - outputs are stored as Parquet or Feather under cache_dir, <key>.<ext>, with a
+        small <key>.json describing the entry
+      - a stage whose key is cached is read back instead of computed, and its inputs
+        are never loaded, so only the stages downstream of a change are recomputed
+      - least recently used entries are evicted once the cache holds more than max_bytes
+    Stage outputs must be DataFrames or dicts of equal-length arrays (outlier masks).
+    """
+
+    extensions = {"parquet": ".parquet", "feather": ".feather"}
+
+    def __init__(self, cache_dir: str, max_bytes: int = 2 * 1024**3, file_format: str = "parquet"):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.file_format = file_format
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def source(self, path: str) -> StageResult:
+        """An input file as the first 'stage', keyed by its content."""
+        return StageResult("source", file_key(path), value=path)
+
+    def stage_key(self, name: str, func, args, params) -> str:
+        digest = hashlib.sha1(name.encode())
+        digest.update(getattr(func, "__qualname__", "").encode())
+        digest.update(code_of(func).encode())
+        for arg in args:
+            digest.update(param_token(arg).encode())
+        for param, value in sorted(params.items()):
+            digest.update(f"{param}={param_token(value)}".encode())
+        return digest.hexdigest()
+
+    def paths(self, key: str):
+        base = os.path.join(self.cache_dir, key)
+        return base + self.extensions[self.file_format], base + ".json"
+
+    def run(self, name: str, func, *args, **params) -> StageResult:
+        """
+        Run func(*args, **params) as stage name, or read its output from the cache.
+        StageResult arguments are passed on as their values.
+        """
+        key = self.stage_key(name, func, args, params)
+        data_path, meta_path = self.paths(key)
+        if os.path.exists(data_path) and os.path.exists(meta_path):
+            os.utime(data_path)  # most recently used
+            print(f"Stage {name}: cached ({key[:12]})")
+            return StageResult(name, key, load=lambda: self.read(data_path, meta_path))
+
+        start = time.perf_counter()
+        values = [arg.value if isinstance(arg, StageResult) else arg for arg in args]
+        params_values = {p: v.value if isinstance(v, StageResult) else v for p, v in params.items()}
+        result = func(*values, **params_values)
+        print(f"Stage {name}: computed in {time.perf_counter() - start:.2f}s ({key[:12]})")
+        self.write(name, key, result)
+        self.evict()
+        return StageResult(name, key, value=result)
+
+    def write(self, name: str, key: str, result) -> None:
+        data_path, meta_path = self.paths(key)
+        kind = "dict" if isinstance(result, dict) else "frame"
+        try:
+            frame = pd.DataFrame(result) if kind == "dict" else result
+            index_name = frame.index.name
+            tmp = data_path + ".tmp"
+            if self.file_format == "feather":
+                # feather only keeps a default index, store the index as a column
+                frame.reset_index(names="__index__").to_feather(tmp)
+            else:
+                frame.to_parquet(tmp)
+            os.replace(tmp, data_path)
+        except (TypeError, ValueError, ImportError, NotImplementedError) as e:
+            print(f"Stage {name}: not cached ({e})")
+            return
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump({"stage": name, "kind": kind, "index_name": index_name,
+                       "created": time.strftime("%Y-%m-%d %H:%M:%S")}, f)
+
+    def read(self, data_path: str, meta_path: str):
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if self.file_format == "feather":
+            frame = pd.read_feather(data_path).set_index("__index__")
+            frame.index.name = meta["index_name"]
+        else:
+            frame = pd.read_parquet(data_path)
+        if meta["kind"] == "dict":
+            return {col: frame[col].to_numpy() for col in frame.columns}
+        return frame
+
+    def evict(self) -> None:
+        """Delete least recently used entries until the cache fits in max_bytes."""
+        extension = self.extensions[self.file_format]
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(extension):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            meta_path = path[:-len(extension)] + ".json"
+            if os.path.exists(meta_path):
+                os.remove(meta_path)
+            total -= size
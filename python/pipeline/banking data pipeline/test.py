@@ -1 +1,49 @@
-
+import os
+import sys
+import tempfile
+import unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "app"))
+from utils import load_data as ld
+
+class DtypePlanTest(unittest.TestCase):
+    '''load_data with a saved dtype plan: values that do not fit the planned
+    integers are never wrapped, the file is loaded without the plan and flagged '''
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="banking_test_")
+        self.path = os.path.join(self.directory, "data.csv")
+
+    def tearDown(self):
+        os.remove(self.path)
+        os.rmdir(self.directory)
+
+    def load(self, text, plan, chunksize=100_000):
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write(text)
+        return ld.load_data(self.path, chunksize=chunksize, dtype_plan=plan)
+
+    def test_fitting_file_gets_the_plan(self):
+        df = self.load("a,b\n1,-5\n200,300\n", {"a": "uint8", "b": "int16"})
+        self.assertEqual(df["a"].dtype, "uint8")
+        self.assertEqual(df["b"].dtype, "int16")
+        self.assertNotIn("dtype_plan_rejected", df.attrs)
+
+    def test_out_of_range_is_rejected(self):
+        df = self.load("a,b\n300,-5\n-5,70000\n", {"a": "uint8", "b": "int16"})
+        self.assertTrue(df.attrs["dtype_plan_rejected"])
+        self.assertEqual(df["a"].tolist(), [300, -5])
+        self.assertEqual(df["b"].tolist(), [-5, 70000])
+
+    def test_out_of_range_in_a_later_chunk_is_rejected(self):
+        df = self.load("a\n1\n2\n3\n256\n", {"a": "uint8"}, chunksize=2)
+        self.assertTrue(df.attrs["dtype_plan_rejected"])
+        self.assertEqual(df["a"].tolist(), [1, 2, 3, 256])
+
+    def test_null_or_fraction_is_rejected(self):
+        for text in ("a,b\n1,x\n,y\n", "a,b\n1,x\n2.5,y\n"):
+            with self.subTest(text=text):
+                df = self.load(text, {"a": "int8"})
+                self.assertTrue(df.attrs["dtype_plan_rejected"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,156 @@
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+import etl_code
+
+# results of a reference run, compared against until --update-baseline saves a new one. Kept in
+# its own directory: the etl job reads every .json file of its working directory as a source
+baseline_file = os.path.join("benchmarks", "benchmark_baseline.json")
+
+def generate_data(directory, files, rows, seed=42):
+    '''Write files csv, files json-lines and files xml files of rows people each
+    (name, height in inches, weight in pounds) into directory '''
+    rng = np.random.default_rng(seed)
+    for i in range(files):
+        for extension in ("csv", "json", "xml"):
+            people = pd.DataFrame({
+                "name": [f"{extension}_{i}_person_{n}" for n in range(rows)],
+                "height": np.round(rng.uniform(55, 80, rows), 2),
+                "weight": np.round(rng.uniform(100, 250, rows), 2),
+            })
+            path = os.path.join(directory, f"source_{i:04d}.{extension}")
+            if extension == "csv":
+                people.to_csv(path, index=False)
+            elif extension == "json":
+                people.to_json(path, orient="records", lines=True)
+            else:
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write("<data>\n")
+                    for name, height, weight in people.itertuples(index=False):
+                        f.write(f"<person><name>{name}</name><height>{height}</height><weight>{weight}</weight></person>\n")
+                    f.write("</data>\n")
+
+def measure(function, repeat, memory=True):
+    '''Best wall time of repeat calls of function, and the peak memory traced while
+    running it once more. Tracing slows python code down, so it is kept out of the 
+    timing. tracemalloc sees python and numpy allocations but not Arrow's own memory 
+    pool, so parquet and feather loads report little memory '''
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    peak_mb = None
+    if memory:
+        tracemalloc.start()
+        function()
+        peak_mb = tracemalloc.get_traced_memory()[1] / 1024**2
+        tracemalloc.stop()
+    return result, best, peak_mb
+
+def summarize(seconds, peak_mb, rows, size=None):
+    return {"seconds": seconds, "rows": rows, "rows_per_sec": rows / seconds if seconds else None,
+            "mb_per_sec": size / 1024**2 / seconds if size and seconds else None, "peak_mb": peak_mb}
+
+def run_benchmark(directory, repeat=3, max_workers=1, memory=True):
+    '''Measure extract (per source format and for all files), transform and load
+    (per output format) on the files in directory. Returns name -> measurements '''
+    results = {}
+    previous = os.getcwd()
+    os.chdir(directory)
+    try:
+        files = etl_code.list_source_files()
+        for extension in ("csv", "json", "xml"):
+            subset = [f for f in files if f.endswith("." + extension)]
+            frames, seconds, peak_mb = measure(lambda: etl_code.extract_frames(subset, max_workers), repeat, memory)
+            size = sum(os.path.getsize(f) for f in subset)
+            results[f"extract_{extension}"] = summarize(seconds, peak_mb, sum(map(len, frames)), size)
+
+        data, seconds, peak_mb = measure(lambda: etl_code.extract(max_workers), repeat, memory)
+        results["extract_all"] = summarize(seconds, peak_mb, len(data), sum(os.path.getsize(f) for f in files))
+
+        # transform works in place as in the pipeline, so every call gets its own copy and only the copy is not timed
+        copies = iter([data.copy() for _ in range(repeat + 1)])
+        transformed, seconds, peak_mb = measure(lambda: etl_code.transform(next(copies), inplace=True), repeat, memory)
+        results["transform"] = summarize(seconds, peak_mb, len(transformed))
+
+        formats = ["csv"] + (["parquet", "feather"] if etl_code.pa is not None else [])
+        for file_format in formats:
+            target = "benchmark_output" + etl_code.TableSink.extensions[file_format]
+            options = {} if file_format == "csv" else {"compression": "zstd", "row_group_size": 100000}
+            _, seconds, peak_mb = measure(
+                lambda: etl_code.load_data(target, transformed, file_format=file_format, **options), repeat, memory)
+            results[f"load_{file_format}"] = summarize(seconds, peak_mb, len(transformed), etl_code.path_size(target))
+    finally:
+        os.chdir(previous)
+    return results
+
+def compare(results, baseline, threshold):
+    '''Regressions of results against baseline: throughput that dropped, or peak
+    memory that grew, by more than threshold (0.2 is 20%) '''
+    regressions = []
+    for name, current in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        rows_per_sec = current["rows_per_sec"]
+        if before["rows_per_sec"] and rows_per_sec is not None and rows_per_sec < before["rows_per_sec"] * (1 - threshold):
+            regressions.append(f"{name}: {current['rows_per_sec']:,.0f} rows/sec, baseline {before['rows_per_sec']:,.0f}")
+        if before["peak_mb"] and current["peak_mb"] and current["peak_mb"] > before["peak_mb"] * (1 + threshold):
+            regressions.append(f"{name}: peak {current['peak_mb']:.1f} MB, baseline {before['peak_mb']:.1f} MB")
+    return regressions
+
+def print_results(results):
+    print(f"{'step':<16}{'seconds':>10}{'rows':>12}{'rows/sec':>14}{'MB/sec':>10}{'peak MB':>10}")
+    for name, r in results.items():
+        mb_per_sec = f"{r['mb_per_sec']:.1f}" if r["mb_per_sec"] else "-"
+        peak_mb = f"{r['peak_mb']:.1f}" if r["peak_mb"] is not None else "-"
+        print(f"{name:<16}{r['seconds']:>10.3f}{r['rows']:>12}{r['rows_per_sec'] or 0:>14,.0f}{mb_per_sec:>10}{peak_mb:>10}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark extract, transform and load of etl_code.py on synthetic data")
+    parser.add_argument("--files", type=int, default=10, help="files generated per format")
+    parser.add_argument("--rows", type=int, default=10000, help="rows per generated file")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per step, the best one counts")
+    parser.add_argument("--workers", type=int, default=1, help="max_workers passed to extract")
+    parser.add_argument("--no-memory", action="store_true", help="skip the traced run measuring peak memory")
+    parser.add_argument("--baseline", default=baseline_file, help="json file with the baseline results")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown or memory growth (0.2 is 20%%)")
+    parser.add_argument("--update-baseline", action="store_true", help="save this run as the new baseline")
+    args = parser.parse_args()
+
+    config = {"files": args.files, "rows": args.rows, "workers": args.workers}
+    directory = tempfile.mkdtemp(prefix="etl_benchmark_")
+    try:
+        generate_data(directory, args.files, args.rows)
+        results = run_benchmark(directory, args.repeat, args.workers, not args.no_memory)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    print_results(results)
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"config": config, "results": results}, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline["config"] != config:
+            print(f"Baseline was measured with {baseline['config']}, not comparing")
+        else:
+            regressions = compare(results, baseline["results"], args.threshold)
+            for regression in regressions:
+                print("REGRESSION", regression)
+            if regressions:
+                raise SystemExit(1)
+            print(f"No regressions beyond {args.threshold:.0%} of the baseline")
+    else:
+        print(f"No baseline at {args.baseline} yet, save one with --update-baseline")
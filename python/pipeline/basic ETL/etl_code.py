@@ -1,61 +1,847 @@
+import bz2
+import fnmatch
 import glob 
+import gzip
+import hashlib
+import io
+import json
+import lzma
+import os
+import re
+import shutil
+import sys
+import time
+import uuid
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+import numpy as np
 import pandas as pd 
 import xml.etree.ElementTree as ET 
 from datetime import datetime 
+from urllib.parse import quote, unquote
+
+try:
+    import pyarrow as pa
+    import pyarrow.json as pa_json
+    import pyarrow.parquet as pq
+except ImportError: # only needed for parquet and feather output and the faster readers
+    pa = pa_json = pq = None
+try:
+    import zstandard
+except ImportError: # only needed for .zst inputs
+    zstandard = None
+try:
+    import resource
+except ImportError: # not available on Windows, peak memory then comes from psutil if installed
+    resource = None
+try:
+    import psutil
+except ImportError:
+    psutil = None
 
 log_file = "log_file.txt" 
+metrics_file = "etl_metrics.jsonl" # per-file and per-phase numbers of every run, one json object per line
 target_file = "transformed_data.csv" 
+output_format = "csv" # csv, parquet or feather (Arrow IPC), written next to target_file with that extension
+# compression and row_group_size apply to parquet and feather, partition_by (a column) to every format
+output_options = {"compression": "zstd", "partition_by": None, "row_group_size": 100000}
+streaming = False # extract, transform and load chunk by chunk instead of one big data frame
+chunk_size = 100000 # rows per chunk in streaming mode
+max_workers = 1 # processes parsing files at the same time, None uses every core
+incremental = False # only process new or changed files and add their rows to the existing target
+full_rebuild = False # in incremental mode, forget the manifest and reprocess every file
+manifest_file = "etl_manifest.json" # path, size, mtime, hash and target rows of each processed file
+columns = ["name", "height", "weight"]
+# source name -> file name pattern and the columns (with dtypes) read from matching files. 
+# Only these columns are read, with these dtypes instead of inferred ones
+schemas = {
+    "people": {"pattern": "*", "columns": {"name": "object", "height": "float64", "weight": "float64"}},
+}
+schema_violations = "quarantine" # a file that does not match its schema is moved to quarantine_dir, "reject" stops the run
+quarantine_dir = "quarantine"
+csv_engine = "pyarrow" if pa is not None else "c" # parser for whole csv files, chunked reads use the c parser
+# column -> (child tag, type) of one xml record, floats and ints are buffered in typed arrays
+xml_fields = {"name": ("name", str), "height": ("height", float), "weight": ("weight", float)}
+# column -> scale factor, decimals to round off to, output dtype ("float32" halves the memory)
+# and an optional (low, high) clip, applied by transform()
+transform_spec = {
+    "height": {"scale": 0.0254, "round": 2, "dtype": "float64"}, # 1 inch is 0.0254 meters
+    "weight": {"scale": 0.45359237, "round": 2, "dtype": "float64"}, # 1 pound is 0.45359237 kilograms
+}
+
+def peak_rss_mb(children=False):
+    # peak resident memory of this process so far, or with children of the largest worker 
+    # process that has finished (the parsing with max_workers > 1), None where it cannot be read
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024**2 if sys.platform == "darwin" else peak / 1024 # bytes on macOS, KB elsewhere
+    if children:
+        return None # psutil cannot see processes that have exited
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / 1024**2
+    return None
+
+def path_size(path):
+    # size in bytes of a file, or of every file under a directory
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(folder, name)) 
+                   for folder, _, names in os.walk(path) for name in names)
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+class RunProfiler:
+    '''Collects wall time, rows in and out, bytes read and written and peak RSS 
+    (of this process, and of the worker processes once they have finished) for the 
+    extract, transform and load phases of one run, as phase totals and as 
+    one record per source file. write() appends them to metrics_file as json lines 
+    and summary() prints a table with one row per phase '''
+    def __init__(self):
+        self.run_id = datetime.now().strftime("%Y%m%d%H%M%S") + "-" + uuid.uuid4().hex[:6]
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.files = []
+
+    def add(self, phase, seconds=0.0, rows_in=0, rows_out=0, bytes_read=0, bytes_written=0):
+        totals = self.phases.setdefault(phase, {"seconds": 0.0, "rows_in": 0, "rows_out": 0, 
+                                                "bytes_read": 0, "bytes_written": 0})
+        totals["seconds"] += seconds
+        totals["rows_in"] += rows_in
+        totals["rows_out"] += rows_out
+        totals["bytes_read"] += bytes_read
+        totals["bytes_written"] += bytes_written
+        totals["peak_rss_mb"] = peak_rss_mb()
+        totals["peak_workers_rss_mb"] = peak_rss_mb(children=True)
+
+    def add_file(self, phase, file_to_process, seconds, rows, bytes_read):
+        self.files.append({"phase": phase, "file": file_to_process, "seconds": seconds, "rows_out": rows, 
+                           "bytes_read": bytes_read, "rows_per_sec": rows / seconds if seconds else None})
+
+    @contextmanager
+    def phase(self, name):
+        # time a block of work as part of phase name, counts are added separately
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, seconds=time.perf_counter() - start)
+
+    def timed(self, name, chunks):
+        # yield from chunks, counting the time spent producing them as phase name
+        iterator = iter(chunks)
+        while True:
+            start = time.perf_counter()
+            chunk = next(iterator, None)
+            if chunk is None:
+                self.add(name, seconds=time.perf_counter() - start)
+                return
+            self.add(name, seconds=time.perf_counter() - start, rows_out=len(chunk))
+            yield chunk
+
+    def records(self):
+        for record in self.files:
+            yield dict(record, run_id=self.run_id, type="file")
+        for name, totals in self.phases.items():
+            rows = totals["rows_out"] or totals["rows_in"]
+            yield dict(totals, run_id=self.run_id, type="phase", phase=name, 
+                       rows_per_sec=rows / totals["seconds"] if totals["seconds"] else None)
+        yield {"run_id": self.run_id, "type": "run", "seconds": time.perf_counter() - self.started, 
+               "peak_rss_mb": peak_rss_mb(), "peak_workers_rss_mb": peak_rss_mb(children=True)}
+
+    def write(self, metrics_file):
+        with open(metrics_file, "a", encoding="utf-8") as f:
+            for record in self.records():
+                f.write(json.dumps(record) + "\n")
+
+    def summary(self):
+        print(f"{'phase':<10}{'seconds':>10}{'rows in':>12}{'rows out':>12}{'rows/sec':>12}"
+              f"{'MB read':>10}{'MB written':>12}{'peak RSS MB':>13}{'workers MB':>12}")
+        for record in self.records():
+            if record["type"] != "phase":
+                continue
+            peak, workers = record["peak_rss_mb"], record["peak_workers_rss_mb"]
+            print(f"{record['phase']:<10}{record['seconds']:>10.3f}{record['rows_in']:>12}{record['rows_out']:>12}"
+                  f"{record['rows_per_sec'] or 0:>12.0f}{record['bytes_read'] / 1024**2:>10.2f}"
+                  f"{record['bytes_written'] / 1024**2:>12.2f}{'n/a' if peak is None else f'{peak:.1f}':>13}"
+                  f"{'n/a' if workers is None else f'{workers:.1f}':>12}")
+
+profiler = RunProfiler()
+
+class SchemaMismatchError(Exception):
+    pass
+
+# what the parsers raise on a file that does not parse as its schema says (ArrowInvalid is a 
+# ValueError), turned into SchemaMismatchError by parsing() around the parser calls only
+parse_errors = (ValueError, ET.ParseError) + ((pa.ArrowException,) if pa is not None else ())
+
+@contextmanager
+def parsing(file_to_process, errors=parse_errors):
+    # a parser failing on the file is a schema mismatch, any other error is a bug and propagates
+    try:
+        yield
+    except SchemaMismatchError:
+        raise
+    except errors as error:
+        raise SchemaMismatchError(f"{file_to_process}: {error}") from error
+
+def schema_for(file_to_process):
+    # columns and dtypes of the first source whose pattern matches the file name
+    name = os.path.basename(file_to_process)
+    for source in schemas.values():
+        if fnmatch.fnmatch(name, source["pattern"]):
+            return source["columns"]
+    raise SchemaMismatchError(f"{file_to_process} matches no source schema")
+
+def conform(dataframe, schema, file_to_process):
+    '''Return the schema's columns of dataframe, in schema order and with the 
+    schema's dtypes. Raises SchemaMismatchError when a column is missing or a 
+    value does not convert '''
+    missing = [column for column in schema if column not in dataframe.columns]
+    if missing:
+        raise SchemaMismatchError(f"{file_to_process} has no column {missing}")
+    if list(dataframe.columns) != list(schema):
+        dataframe = dataframe[list(schema)]
+    try:
+        return dataframe.astype(schema, copy=False)
+    except (ValueError, TypeError) as e:
+        raise SchemaMismatchError(f"{file_to_process}: {e}") from e
+
+def quarantine(file_to_process, error):
+    # move a file that does not match its schema out of the way, or stop the run
+    if schema_violations == "reject":
+        raise error
+    os.makedirs(quarantine_dir, exist_ok=True)
+    shutil.move(file_to_process, os.path.join(quarantine_dir, os.path.basename(file_to_process)))
+    log_progress(f"Quarantined {file_to_process}: {error}")
+
+def open_zstd(file_to_process):
+    if zstandard is None:
+        raise ImportError(f"zstandard is required to read {file_to_process}")
+    return zstandard.ZstdDecompressor().stream_reader(open(file_to_process, "rb"), closefd=True)
+
+# compressed inputs are decompressed as a stream while they are parsed, never to disk
+decompressors = {".gz": gzip.open, ".bz2": bz2.open, ".xz": lzma.open, ".zst": open_zstd}
+
+def source_format(file_to_process):
+    # ".csv", ".json" or ".xml", looking through a compression suffix (people.csv.gz is ".csv")
+    name, extension = os.path.splitext(file_to_process)
+    if extension in decompressors:
+        extension = os.path.splitext(name)[1]
+    return extension
+
+def open_source(file_to_process):
+    # a binary stream of the file's (decompressed) bytes
+    decompress = decompressors.get(os.path.splitext(file_to_process)[1])
+    if decompress is None:
+        return open(file_to_process, "rb")
+    return decompress(file_to_process)
 
 def extract_from_csv(file_to_process):
-    dataframe = pd.read_csv(file_to_process)
+    # only the schema's columns are parsed, straight into the schema's dtypes
+    schema = schema_for(file_to_process)
+    with open_source(file_to_process) as source, parsing(file_to_process):
+        dataframe = pd.read_csv(source, usecols=list(schema), dtype=schema, engine=csv_engine)
     return dataframe
 
 def extract_from_json(file_to_process): 
-    dataframe = pd.read_json(file_to_process, lines=True) 
+    schema = schema_for(file_to_process)
+    with open_source(file_to_process) as source:
+        if pa_json is not None:
+            return read_json_with_arrow(source, schema, file_to_process)
+        with parsing(file_to_process):
+            dataframe = pd.read_json(io.TextIOWrapper(source, encoding="utf-8"), lines=True, dtype=schema) 
+    return dataframe
+
+def json_keys(file_to_process, keys, block_size=1 << 20):
+    # which of keys occur as a field name ("key": ...) in the file, scanned block by 
+    # block without parsing, so other fields of any shape do not matter
+    patterns = {key: re.compile(rb'"' + re.escape(json.dumps(key)[1:-1].encode()) + rb'"\s*:') for key in keys}
+    found = set()
+    tail = b""
+    with open_source(file_to_process) as source:
+        for block in iter(lambda: source.read(block_size), b""):
+            data = tail + block
+            found.update(key for key, pattern in patterns.items() if key not in found and pattern.search(data))
+            if len(found) == len(patterns):
+                break
+            tail = data[-256:]
+    return found
+
+def read_json_with_arrow(source, schema, file_to_process):
+    # fields outside the schema are skipped while parsing and the rest are parsed as 
+    # the schema's types. A field no record has also comes back as all nulls, so only 
+    # when a column is all null the file is parsed again for its keys: a field that 
+    # is there with null values is fine, like an empty column of a csv file
+    fields = [pa.field(column, pa.string() if dtype in ("object", "str", "string") else pa.from_numpy_dtype(np.dtype(dtype))) 
+              for column, dtype in schema.items()]
+    options = pa_json.ParseOptions(explicit_schema=pa.schema(fields), unexpected_field_behavior="ignore")
+    with parsing(file_to_process):
+        table = pa_json.read_json(source, parse_options=options)
+    all_null = [column for column in schema if table.num_rows and table.column(column).null_count == table.num_rows]
+    if all_null:
+        present = json_keys(file_to_process, all_null)
+        missing = [column for column in all_null if column not in present]
+        if missing:
+            raise SchemaMismatchError(f"{file_to_process} has no column {missing}")
+    return table.to_pandas()
+
+def extract_from_xml(file_to_process, field_map=None): 
+    # one pass over the file, building the data frame once at the end
+    frames = list(extract_chunks_from_xml(file_to_process, None, field_map))
+    if not frames:
+        return pd.DataFrame(columns=list(field_map or xml_fields))
+    return frames[0]
+
+def extract_chunks_from_csv(file_to_process, chunk_size):
+    schema = schema_for(file_to_process)
+    with open_source(file_to_process) as source, parsing(file_to_process), \
+         pd.read_csv(source, chunksize=chunk_size, usecols=list(schema), dtype=schema) as reader:
+        yield from reader
+
+def extract_chunks_from_json(file_to_process, chunk_size):
+    schema = schema_for(file_to_process)
+    with open_source(file_to_process) as source, parsing(file_to_process), \
+         pd.read_json(io.TextIOWrapper(source, encoding="utf-8"), lines=True, chunksize=chunk_size, dtype=schema) as reader:
+        yield from reader
+
+def new_xml_buffers(field_map):
+    typecodes = {float: "d", int: "q"}
+    return {column: array(typecodes[kind]) if kind in typecodes else [] 
+            for column, (tag, kind) in field_map.items()}
+
+def xml_buffers_to_frame(buffers):
+    # typed arrays are handed to pandas as numpy views, without boxing every value
+    return pd.DataFrame({column: np.frombuffer(values, dtype=values.typecode) if isinstance(values, array) else values 
+                         for column, values in buffers.items()})
+
+def extract_chunks_from_xml(file_to_process, chunk_size, field_map=None):
+    '''Parse the file incrementally with iterparse. Every direct child of the root 
+    is one record whose fields are read as field_map describes (xml_fields by 
+    default). Values go into column buffers and each record is cleared once read, 
+    so a chunk of chunk_size rows (the whole file when None) is the only thing held '''
+    field_map = field_map or xml_fields
+    buffers = new_xml_buffers(field_map)
+    rows = 0
+    root = None
+    depth = 0
+    # only the xml parser's errors are caught around the loop, the loop's own code is not the file's fault
+    with open_source(file_to_process) as source, parsing(file_to_process, ET.ParseError):
+        for event, elem in ET.iterparse(source, events=("start", "end")):
+            if event == "start":
+                if root is None:
+                    root = elem
+                depth += 1
+                continue
+            depth -= 1
+            if depth != 1: # only direct children of the root are records
+                continue
+            for column, (tag, kind) in field_map.items():
+                text = elem.findtext(tag)
+                if text is not None:
+                    try:
+                        value = kind(text)
+                    except ValueError as error:
+                        raise SchemaMismatchError(f"{file_to_process}: <{tag}> {text!r} is not {kind.__name__}") from error
+                    buffers[column].append(value)
+                elif kind is float:
+                    buffers[column].append(np.nan)
+                elif kind is int:
+                    raise SchemaMismatchError(f"{file_to_process}: a record has no <{tag}> for int column {column}")
+                else:
+                    buffers[column].append(None)
+            root.clear() # drop the parsed record so the tree never grows
+            rows += 1
+            if rows == chunk_size:
+                yield xml_buffers_to_frame(buffers)
+                buffers = new_xml_buffers(field_map)
+                rows = 0
+    if rows:
+        yield xml_buffers_to_frame(buffers)
+
+def list_source_files():
+    # all csv files except the target file, then all json files, then all xml files,
+    # each sorted by name so the row order is the same on every run. Compressed 
+    # files (.gz, .bz2, .xz, .zst) count as the format under the compression suffix
+    found = {".csv": [], ".json": [], ".xml": []}
+    for file_to_process in glob.glob("*"):
+        if file_to_process in (target_file, manifest_file) or not os.path.isfile(file_to_process):
+            continue
+        extension = source_format(file_to_process)
+        if extension in found:
+            found[extension].append(file_to_process)
+    return sorted(found[".csv"]) + sorted(found[".json"]) + sorted(found[".xml"])
+
+def empty_frame(schema=None):
+    if schema is None:
+        return pd.DataFrame(columns=columns)
+    return pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in schema.items()})
+
+def extract_file(file_to_process):
+    '''Read one source file and conform it to its schema. A file that does not 
+    conform is quarantined and contributes no rows '''
+    schema = None
+    try:
+        schema = schema_for(file_to_process)
+        extension = source_format(file_to_process)
+        if extension == ".csv":
+            dataframe = extract_from_csv(file_to_process)
+        elif extension == ".json":
+            dataframe = extract_from_json(file_to_process)
+        else:
+            dataframe = extract_from_xml(file_to_process)
+        return conform(dataframe, schema, file_to_process)
+    except SchemaMismatchError as error:
+        quarantine(file_to_process, error)
+        return empty_frame(schema)
+
+def extract_file_timed(file_to_process):
+    # extract_file plus the seconds it took, measured where the parsing happens
+    start = time.perf_counter()
+    dataframe = extract_file(file_to_process)
+    return dataframe, time.perf_counter() - start
+
+def profile_file(file_to_process, rows, seconds):
+    bytes_read = path_size(file_to_process) # 0 once a file has been quarantined
+    profiler.add_file("extract", file_to_process, seconds, rows, bytes_read)
+    profiler.add("extract", bytes_read=bytes_read)
+
+def finish_file(file_to_process, future):
+    dataframe, seconds = future.result()
+    profile_file(file_to_process, len(dataframe), seconds)
     return dataframe
 
-def extract_from_xml(file_to_process): 
-    dataframe = pd.DataFrame(columns=["name", "height", "weight"]) 
-    tree = ET.parse(file_to_process) 
-    root = tree.getroot() 
-    for person in root: 
-        name = person.find("name").text 
-        height = float(person.find("height").text) 
-        weight = float(person.find("weight").text) 
-        dataframe = pd.concat([dataframe, pd.DataFrame([{"name":name, "height":height, "weight":weight}])], ignore_index=True) 
-    return dataframe 
-
-def extract(): 
-    extracted_data = pd.DataFrame(columns=['name','height','weight']) # create an empty data frame to hold extracted data 
-     
-    # process all csv files, except the target file
-    for csvfile in glob.glob("*.csv"): 
-        if csvfile != target_file:  # check if the file is not the target file
-            extracted_data = pd.concat([extracted_data, pd.DataFrame(extract_from_csv(csvfile))], ignore_index=True) 
-         
-    # process all json files 
-    for jsonfile in glob.glob("*.json"): 
-        extracted_data = pd.concat([extracted_data, pd.DataFrame(extract_from_json(jsonfile))], ignore_index=True) 
-     
-    # process all xml files 
-    for xmlfile in glob.glob("*.xml"): 
-        extracted_data = pd.concat([extracted_data, pd.DataFrame(extract_from_xml(xmlfile))], ignore_index=True) 
-         
-    return extracted_data 
-
-def transform(data): 
-    '''Convert inches to meters and round off to two decimals 
-    1 inch is 0.0254 meters '''
-    data['height'] = round(data.height * 0.0254,2) 
- 
-    '''Convert pounds to kilograms and round off to two decimals 
-    1 pound is 0.45359237 kilograms '''
-    data['weight'] = round(data.weight * 0.45359237,2) 
-    
+def extract_files_parallel(files, max_workers):
+    '''Parse files in a process pool and yield each file's data frame in the 
+    order of files, whichever worker finishes first. At most two files per 
+    worker are in flight, so parsed frames waiting to be consumed stay bounded '''
+    max_workers = max_workers or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque()
+        for file_to_process in files:
+            pending.append((file_to_process, executor.submit(extract_file_timed, file_to_process)))
+            if len(pending) >= 2 * max_workers:
+                yield finish_file(*pending.popleft())
+        while pending:
+            yield finish_file(*pending.popleft())
+
+def extract_frames(files, max_workers=1):
+    # one data frame per file, in the order of files
+    if max_workers == 1:
+        frames = []
+        for file_to_process in files:
+            dataframe, seconds = extract_file_timed(file_to_process)
+            profile_file(file_to_process, len(dataframe), seconds)
+            frames.append(dataframe)
+        return frames
+    return list(extract_files_parallel(files, max_workers))
+
+def extract(max_workers=1): 
+    # collect one data frame per file and concatenate once, instead of copying
+    # everything read so far for every new file
+    frames = extract_frames(list_source_files(), max_workers)
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)
+
+def extract_chunks(chunk_size, max_workers=1):
+    '''Yield the extracted data chunk by chunk, so only one chunk of 
+    chunk_size rows is held in memory at a time. With more than one worker 
+    each file is parsed whole in a worker process and yielded as one chunk. 
+    A file found not to match its schema part way through is quarantined, 
+    but the chunks yielded before that point have already been loaded '''
+    files = list_source_files()
+    if max_workers != 1:
+        yield from extract_files_parallel(files, max_workers)
+        return
+    readers = {".csv": extract_chunks_from_csv, 
+               ".json": extract_chunks_from_json, 
+               ".xml": extract_chunks_from_xml}
+    for file_to_process in files:
+        extension = source_format(file_to_process)
+        seconds = rows = 0
+        chunks = None
+        try:
+            schema = schema_for(file_to_process)
+            chunks = readers[extension](file_to_process, chunk_size)
+            while True:
+                # only the time spent inside the reader counts, not the consumer's
+                start = time.perf_counter()
+                chunk = next(chunks, None)
+                if chunk is not None:
+                    chunk = conform(chunk, schema, file_to_process)
+                seconds += time.perf_counter() - start
+                if chunk is None:
+                    break
+                rows += len(chunk)
+                yield chunk
+        except SchemaMismatchError as error:
+            if chunks is not None:
+                chunks.close()
+            quarantine(file_to_process, error)
+        profile_file(file_to_process, rows, seconds)
+
+def transform(data, spec=None, inplace=False): 
+    '''Apply the unit conversions in spec (transform_spec by default): inches to 
+    meters and pounds to kilograms, rounded off to two decimals. Scale, round and 
+    clip of a column all write into one output array, so no temporary Series is 
+    made. The array is a new one assigned to the column, or with inplace the 
+    column's own buffer when it already has the target dtype: only for a data 
+    frame the caller owns, a view of another frame would be overwritten too '''
+    for column, rule in (spec or transform_spec).items():
+        values = data[column].to_numpy()
+        if values.dtype.kind not in "iuf":
+            values = values.astype(np.float64)
+        dtype = np.dtype(rule.get("dtype", "float64"))
+        in_place = inplace and values.dtype == dtype and values.flags.writeable
+        out = values if in_place else np.empty(len(values), dtype=dtype)
+        np.multiply(values, rule["scale"], out=out, casting="unsafe")
+        if "round" in rule:
+            np.round(out, rule["round"], out=out)
+        if "clip" in rule:
+            np.clip(out, *rule["clip"], out=out)
+        if not in_place:
+            data[column] = out
     return data 
 
-def load_data(target_file, transformed_data): 
-    transformed_data.to_csv(target_file) 
+class TableSink:
+    '''Writes data frames to target chunk by chunk as csv, parquet or feather. 
+    A csv target is one file. A parquet or feather target is a directory of part 
+    files read in name order (part-00000-<run>.parquet, ...), and with partition_by 
+    any target is a directory with one partition_by=value sub-directory per value, 
+    holding part files. A sink keeps one open part file per partition value (or 
+    one in all), parquet and feather rows are buffered until row_group_size rows 
+    are written at once, so a run adds one file per value however many chunks it 
+    writes. Everything is written to temporary files that are renamed on close, 
+    so readers never see a half-written target. With append the rows are added 
+    to an existing target without touching its rows: a new part file for a 
+    parquet or feather target, new part files per partition, rows added to the 
+    end of a copy of a csv file, so a failed append leaves no rows behind '''
+    extensions = {"csv": ".csv", "parquet": ".parquet", "feather": ".feather"}
+
+    def __init__(self, target, file_format="csv", compression=None, partition_by=None, 
+                 row_group_size=None, append=False):
+        if file_format not in self.extensions:
+            raise ValueError(f"Unknown output format {file_format}, expected one of {list(self.extensions)}")
+        if file_format != "csv" and pa is None:
+            raise ImportError(f"pyarrow is required to write {file_format} output")
+        self.target = target
+        self.file_format = file_format
+        self.compression = compression
+        self.partition_by = partition_by
+        self.row_group_size = row_group_size
+        self.append = append and os.path.exists(target)
+        self.run_id = uuid.uuid4().hex[:12]
+        self.parts = {} # partition value (None when not partitioned) -> its open part file
+        self.started = False
+        if partition_by or file_format != "csv":
+            # a fresh target is built in a temporary directory and swapped in on close
+            self.path = target if self.append else target + ".tmp"
+            if not self.append:
+                shutil.rmtree(self.path, ignore_errors=True)
+            os.makedirs(self.path, exist_ok=True)
+        else:
+            self.path = target + ".tmp"
+            if self.append:
+                shutil.copyfile(target, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write(self, data):
+        if data.empty and (self.started or self.append):
+            return # an empty chunk adds nothing, and no empty part file either
+        if self.partition_by:
+            for value, group in data.groupby(self.partition_by, sort=False, dropna=False):
+                self._write_part(value, group.drop(columns=self.partition_by))
+        elif self.file_format == "csv":
+            started = self.append or self.started
+            data.to_csv(self.path, mode="a" if started else "w", header=not started)
+        else:
+            self._write_part(None, data)
+        self.started = True
+
+    def close(self):
+        if not self.partition_by and not self.started and not self.append:
+            # nothing was written, still leave an empty target behind
+            self.write(pd.DataFrame(columns=columns))
+        for part in self.parts.values():
+            if part["writer"] is not None:
+                self._flush(part)
+                part["writer"].close()
+            os.replace(part["file"] + ".tmp", part["file"])
+        self.parts = {}
+        if self.path == self.target:
+            return
+        if os.path.isdir(self.path):
+            old = self.target + ".old"
+            if os.path.exists(self.target):
+                os.replace(self.target, old)
+            os.replace(self.path, self.target)
+            shutil.rmtree(old, ignore_errors=True)
+        else:
+            os.replace(self.path, self.target)
+
+    def abort(self):
+        # drop whatever this sink wrote, the previous target stays as it was
+        for part in self.parts.values():
+            if part["writer"] is not None:
+                part["writer"].close()
+            os.remove(part["file"] + ".tmp")
+            if not os.listdir(part["directory"]):
+                os.rmdir(part["directory"]) # a partition this sink created
+        self.parts = {}
+        if self.path == self.target:
+            return
+        if os.path.isdir(self.path):
+            shutil.rmtree(self.path, ignore_errors=True)
+        elif os.path.exists(self.path):
+            os.remove(self.path)
+
+    def _open_part(self, directory, data):
+        # one new part file in directory, numbered after the parts already there so 
+        # reading the parts in name order gives the rows in the order they were added
+        os.makedirs(directory, exist_ok=True)
+        extension = self.extensions[self.file_format]
+        existing = sorted(name for name in os.listdir(directory) if name.endswith(extension))
+        number = int(existing[-1].split("-")[1]) + 1 if existing else 0
+        part = {"directory": directory, "file": os.path.join(directory, f"part-{number:05d}-{self.run_id}{extension}"), 
+                "writer": None, "schema": None, "buffered": [], "rows": 0}
+        if self.file_format != "csv":
+            if existing:
+                # appended rows keep the column types of the target
+                part["schema"] = read_schema(os.path.join(directory, existing[0]), self.file_format)
+            else:
+                part["schema"] = pa.Schema.from_pandas(data, preserve_index=False)
+            part["writer"] = self._new_writer(part["file"] + ".tmp", part["schema"])
+        return part
+
+    def _new_writer(self, path, schema):
+        if self.file_format == "parquet":
+            return pq.ParquetWriter(path, schema, compression=self.compression or "none")
+        options = pa.ipc.IpcWriteOptions(compression=self.compression)
+        return pa.ipc.new_file(path, schema, options=options)
+
+    def _write_part(self, value, data):
+        # add rows to the part file of a partition value, None when not partitioned
+        part = self.parts.get(value)
+        if part is None:
+            directory = self.path if value is None else os.path.join(self.path, f"{self.partition_by}={quote(str(value), safe='')}")
+            part = self.parts[value] = self._open_part(directory, data)
+        if self.file_format == "csv":
+            data.to_csv(part["file"] + ".tmp", mode="a", header=part["rows"] == 0)
+            part["rows"] += len(data)
+            return
+        part["buffered"].append(pa.Table.from_pandas(data, schema=part["schema"], preserve_index=False))
+        part["rows"] += len(data)
+        if self.row_group_size is None or sum(len(t) for t in part["buffered"]) >= self.row_group_size:
+            self._flush(part, whole_groups=True)
+
+    def _flush(self, part, whole_groups=False):
+        # write the buffered rows of a part file as row groups (record batches for feather) of 
+        # row_group_size rows. With whole_groups the rows left over stay buffered for the next group
+        if not part["buffered"]:
+            return
+        table = pa.concat_tables(part["buffered"])
+        rows = len(table)
+        if whole_groups and self.row_group_size:
+            rows -= rows % self.row_group_size
+        if self.file_format == "parquet":
+            part["writer"].write_table(table.slice(0, rows), row_group_size=self.row_group_size)
+        else:
+            part["writer"].write_table(table.slice(0, rows), max_chunksize=self.row_group_size)
+        part["buffered"] = [table.slice(rows)] if rows < len(table) else []
+
+def read_schema(path, file_format):
+    if file_format == "parquet":
+        return pq.read_schema(path)
+    with pa.memory_map(path) as source:
+        return pa.ipc.open_file(source).schema
+
+def output_path():
+    # transformed_data.csv, or a transformed_data.parquet or transformed_data.feather 
+    # directory of part files, or a transformed_data directory when the output is partitioned
+    base = os.path.splitext(target_file)[0]
+    if output_options.get("partition_by"):
+        return base
+    return base + TableSink.extensions[output_format]
+
+def open_target(append=False):
+    return TableSink(output_path(), output_format, append=append, **output_options)
+
+def read_parts(directory):
+    # the part files of a directory in name order, which is the order their rows were added in
+    extension = TableSink.extensions[output_format]
+    parts = sorted(name for name in os.listdir(directory) if name.endswith(extension))
+    if output_format == "csv":
+        return [pd.read_csv(os.path.join(directory, name), index_col=0) for name in parts]
+    read = pd.read_parquet if output_format == "parquet" else pd.read_feather
+    return [read(os.path.join(directory, name)) for name in parts]
+
+def read_target():
+    path = output_path()
+    partition_by = output_options.get("partition_by")
+    if partition_by:
+        # every partition_by=value directory, with the value put back as a column
+        frames = []
+        for directory in sorted(os.listdir(path)):
+            name, _, value = directory.partition("=")
+            if name == partition_by and os.path.isdir(os.path.join(path, directory)):
+                frames += [frame.assign(**{partition_by: unquote(value)}) 
+                           for frame in read_parts(os.path.join(path, directory))]
+        if not frames:
+            return pd.DataFrame(columns=columns)
+        # csv parts keep the row numbers, which give back the order the rows were loaded in
+        return pd.concat(frames).sort_index() if output_format == "csv" else pd.concat(frames, ignore_index=True)
+    if output_format == "csv":
+        return pd.read_csv(path, index_col=0)
+    frames = read_parts(path)
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+
+def load_data(target_file, transformed_data, append=False, file_format="csv", **sink_options): 
+    '''Write transformed_data to target_file through a TableSink, see TableSink 
+    for the format, partitioning and append options '''
+    with TableSink(target_file, file_format, append=append, **sink_options) as sink:
+        sink.write(transformed_data)
+
+def run_streaming(chunk_size, max_workers=1):
+    '''Extract, transform and load one chunk at a time. Memory stays at about 
+    one chunk however large the input is. Returns the number of rows loaded '''
+    header = None
+    rows_loaded = 0
+    sink = open_target()
+    try:
+        for chunk in profiler.timed("extract", extract_chunks(chunk_size, max_workers)):
+            if header is None:
+                header = list(chunk.columns)
+            # line the columns up with the header already written and keep the row 
+            # numbers running on from the previous chunk, as in the batch output
+            chunk = chunk.reindex(columns=header)
+            chunk.index = pd.RangeIndex(rows_loaded, rows_loaded + len(chunk))
+            with profiler.phase("transform"):
+                transformed = transform(chunk, inplace=True)
+            profiler.add("transform", rows_in=len(chunk), rows_out=len(transformed))
+            with profiler.phase("load"):
+                sink.write(transformed)
+            profiler.add("load", rows_in=len(transformed), rows_out=len(transformed))
+            rows_loaded += len(chunk)
+    except BaseException:
+        sink.abort()
+        raise
+    with profiler.phase("load"):
+        sink.close()
+    profiler.add("load", bytes_written=path_size(output_path()))
+    return rows_loaded
+
+def file_fingerprint(file_to_process, previous=None):
+    '''Size, modification time and sha256 of a file. When size and mtime match 
+    the previous fingerprint its hash is reused instead of reading the file again '''
+    stat = os.stat(file_to_process)
+    if previous and previous["size"] == stat.st_size and previous["mtime"] == stat.st_mtime:
+        return {"size": stat.st_size, "mtime": stat.st_mtime, "sha256": previous["sha256"]}
+    digest = hashlib.sha256()
+    with open(file_to_process, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return {"size": stat.st_size, "mtime": stat.st_mtime, "sha256": digest.hexdigest()}
+
+def load_manifest():
+    if not os.path.exists(manifest_file):
+        return {"files": {}}
+    with open(manifest_file, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_manifest(manifest):
+    # write a temporary file and rename it, so a failed run never leaves half a manifest
+    temp_file = manifest_file + ".tmp"
+    with open(temp_file, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(temp_file, manifest_file)
+
+def run_incremental(max_workers=1, full_rebuild=False):
+    '''Process only the files that are new or changed since the manifest was written. 
+    Rows of new files are appended to the target. When a processed file changed or 
+    disappeared, its old rows are dropped and the target is rewritten (a merge). 
+    full_rebuild, or a missing target, reprocesses everything. The pending files are 
+    read in one batch, so this mode is meant for a few files per run. Returns the 
+    number of rows added '''
+    if full_rebuild or not os.path.exists(output_path()):
+        manifest = {"files": {}}
+    else:
+        manifest = load_manifest()
+    recorded = manifest["files"]
+
+    files = list_source_files()
+    fingerprints = {f: file_fingerprint(f, recorded.get(f)) for f in files}
+    pending = [f for f in files if f not in recorded or recorded[f]["sha256"] != fingerprints[f]["sha256"]]
+    stale = [f for f in recorded if f not in fingerprints or f in pending]
+    if stale and output_options.get("partition_by"):
+        # rows of a partitioned target cannot be found by position, rebuild it instead
+        recorded.clear()
+        pending, stale = files, []
+    if recorded and not pending and not stale:
+        # nothing new, changed or removed: leave the target alone, only refresh the mtimes
+        for f in files:
+            recorded[f].update(fingerprints[f])
+        save_manifest(manifest)
+        return 0
+
+    with profiler.phase("extract"):
+        frames = extract_frames(pending, max_workers)
+    profiler.add("extract", rows_out=sum(map(len, frames)))
+    with profiler.phase("transform"):
+        frames = [transform(frame, inplace=True) for frame in frames]
+        new_data = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+    profiler.add("transform", rows_in=len(new_data), rows_out=len(new_data))
+
+    load_started = time.perf_counter()
+    size_before = path_size(output_path())
+    if not recorded:
+        # nothing loaded yet, write the target from scratch
+        with open_target() as sink:
+            sink.write(new_data)
+        next_row = 0
+    elif stale:
+        # merge: drop the rows the stale files produced and renumber what is left
+        existing = read_target()
+        keep = np.ones(len(existing), dtype=bool)
+        for f in stale:
+            keep[recorded[f]["first_row"]:recorded[f]["first_row"] + recorded[f]["rows"]] = False
+        next_row = 0
+        for f in sorted(set(recorded) - set(stale), key=lambda f: recorded[f]["first_row"]):
+            recorded[f]["first_row"] = next_row
+            next_row += recorded[f]["rows"]
+        with open_target() as sink:
+            sink.write(pd.concat([existing[keep]] + frames, ignore_index=True))
+        for f in stale:
+            del recorded[f]
+    else:
+        # only new files: append after the rows already in the target
+        next_row = sum(entry["rows"] for entry in recorded.values())
+        new_data.index = pd.RangeIndex(next_row, next_row + len(new_data))
+        with open_target(append=True) as sink:
+            sink.write(new_data)
+    size_after = path_size(output_path())
+    profiler.add("load", seconds=time.perf_counter() - load_started, rows_in=len(new_data), 
+                 rows_out=len(new_data), bytes_written=size_after - size_before if recorded and not stale else size_after)
+
+    new_rows = dict(zip(pending, map(len, frames)))
+    for f in files:
+        if not os.path.exists(f):
+            continue # quarantined during this run
+        if f in new_rows:
+            recorded[f] = dict(fingerprints[f], rows=new_rows[f], first_row=next_row)
+            next_row += new_rows[f]
+        else:
+            recorded[f].update(fingerprints[f])
+    save_manifest(manifest)
+    return len(new_data)
 
 def log_progress(message): 
     timestamp_format = '%Y-%h-%d-%H:%M:%S' # Year-Monthname-Day-Hour-Minute-Second 
@@ -64,31 +850,55 @@ def log_progress(message):
     with open(log_file,"a") as f: 
         f.write(timestamp + ',' + message + '\n') 
 
-# Log the initialization of the ETL process 
-log_progress("ETL Job Started") 
- 
-# Log the beginning of the Extraction process 
-log_progress("Extract phase Started") 
-extracted_data = extract() 
- 
-# Log the completion of the Extraction process 
-log_progress("Extract phase Ended") 
- 
-# Log the beginning of the Transformation process 
-log_progress("Transform phase Started") 
-transformed_data = transform(extracted_data) 
-print("Transformed Data") 
-print(transformed_data) 
- 
-# Log the completion of the Transformation process 
-log_progress("Transform phase Ended") 
- 
-# Log the beginning of the Loading process 
-log_progress("Load phase Started") 
-load_data(target_file,transformed_data) 
- 
-# Log the completion of the Loading process 
-log_progress("Load phase Ended") 
- 
-# Log the completion of the ETL process 
-log_progress("ETL Job Ended") 
\ No newline at end of file
+if __name__ == "__main__":
+    # Log the initialization of the ETL process
+    log_progress("ETL Job Started")
+
+    if incremental:
+        # Only new or changed files are extracted, transformed and loaded
+        log_progress("Incremental ETL phase Started")
+        rows_loaded = run_incremental(max_workers, full_rebuild)
+        log_progress(f"Incremental ETL phase Ended, {rows_loaded} rows loaded")
+    elif streaming:
+        # Extract, transform and load interleave chunk by chunk
+        log_progress("Streaming ETL phase Started")
+        rows_loaded = run_streaming(chunk_size, max_workers)
+        log_progress(f"Streaming ETL phase Ended, {rows_loaded} rows loaded")
+    else:
+        # Log the beginning of the Extraction process
+        log_progress("Extract phase Started")
+        with profiler.phase("extract"):
+            extracted_data = extract(max_workers)
+        profiler.add("extract", rows_out=len(extracted_data))
+
+        # Log the completion of the Extraction process
+        log_progress("Extract phase Ended")
+
+        # Log the beginning of the Transformation process
+        log_progress("Transform phase Started")
+        rows_in = len(extracted_data)
+        with profiler.phase("transform"):
+            transformed_data = transform(extracted_data, inplace=True)
+        profiler.add("transform", rows_in=rows_in, rows_out=len(transformed_data))
+        print("Transformed Data")
+        print(transformed_data)
+
+        # Log the completion of the Transformation process
+        log_progress("Transform phase Ended")
+
+        # Log the beginning of the Loading process
+        log_progress("Load phase Started")
+        with profiler.phase("load"), open_target() as sink:
+            sink.write(transformed_data)
+        profiler.add("load", rows_in=len(transformed_data), rows_out=len(transformed_data), 
+                     bytes_written=path_size(output_path()))
+
+        # Log the completion of the Loading process
+        log_progress("Load phase Ended")
+
+    # Log the completion of the ETL process
+    log_progress("ETL Job Ended")
+
+    # Per-file and per-phase numbers of this run
+    profiler.write(metrics_file)
+    profiler.summary()
\ No newline at end of file
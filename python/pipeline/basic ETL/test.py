@@ -1 +1,161 @@
-
+import os
+import shutil
+import tempfile
+import unittest
+import etl_code
+
+class IncrementalRunTest(unittest.TestCase):
+    '''run_incremental on a temporary directory: new files are appended, changed
+    and removed files are merged out, and the manifest keeps each file's rows '''
+
+    def setUp(self):
+        self.previous = os.getcwd()
+        self.directory = tempfile.mkdtemp(prefix="etl_test_")
+        os.chdir(self.directory)
+        self.options = (etl_code.output_format, dict(etl_code.output_options))
+        etl_code.output_options["partition_by"] = None
+
+    def tearDown(self):
+        etl_code.output_format, etl_code.output_options = self.options
+        os.chdir(self.previous)
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def write_source(self, name, prefix, rows):
+        with open(name, "w", encoding="utf-8") as f:
+            f.write("name,height,weight\n")
+            for i in range(rows):
+                f.write(f"{prefix}_{i},{60 + i},{150 + i}\n")
+
+    def target_names(self):
+        return etl_code.read_target()["name"].tolist()
+
+    def target_files(self):
+        # path -> (inode, mtime) of the target file, or of every file under a target directory
+        path = etl_code.output_path()
+        files = [os.path.join(folder, name) for folder, _, names in os.walk(path) for name in names] or [path]
+        return {f: (os.stat(f).st_ino, os.stat(f).st_mtime_ns) for f in files}
+
+    def check_manifest(self):
+        # every file's first_row and rows point at its own rows in the target
+        names = self.target_names()
+        files = etl_code.load_manifest()["files"]
+        self.assertEqual(sum(entry["rows"] for entry in files.values()), len(names))
+        for f, entry in files.items():
+            prefix = os.path.splitext(f)[0]
+            rows = names[entry["first_row"]:entry["first_row"] + entry["rows"]]
+            self.assertTrue(all(name.startswith(prefix + "_") for name in rows), f)
+
+    def run_all_formats(self, test):
+        for file_format in ["csv"] + (["parquet", "feather"] if etl_code.pa is not None else []):
+            with self.subTest(file_format=file_format):
+                etl_code.output_format = file_format
+                for name in os.listdir("."):
+                    shutil.rmtree(name) if os.path.isdir(name) else os.remove(name)
+                test()
+
+    def test_add(self):
+        def test():
+            self.write_source("a.csv", "a", 3)
+            self.write_source("b.csv", "b", 2)
+            self.assertEqual(etl_code.run_incremental(), 5)
+            self.write_source("c.csv", "c", 4)
+            self.assertEqual(etl_code.run_incremental(), 4)
+            self.assertEqual(self.target_names(), [f"a_{i}" for i in range(3)] + ["b_0", "b_1"] + [f"c_{i}" for i in range(4)])
+            self.check_manifest()
+        self.run_all_formats(test)
+
+    def test_change(self):
+        def test():
+            self.write_source("a.csv", "a", 3)
+            self.write_source("b.csv", "b", 2)
+            etl_code.run_incremental()
+            self.write_source("a.csv", "a", 5)
+            self.assertEqual(etl_code.run_incremental(), 5)
+            # the old rows of a.csv are gone, its new rows come after b.csv's
+            self.assertEqual(self.target_names(), ["b_0", "b_1"] + [f"a_{i}" for i in range(5)])
+            self.check_manifest()
+        self.run_all_formats(test)
+
+    def test_remove(self):
+        def test():
+            for name, rows in (("a.csv", 3), ("b.csv", 2), ("c.csv", 4)):
+                self.write_source(name, name[0], rows)
+            etl_code.run_incremental()
+            os.remove("b.csv")
+            self.assertEqual(etl_code.run_incremental(), 0)
+            self.assertEqual(self.target_names(), [f"a_{i}" for i in range(3)] + [f"c_{i}" for i in range(4)])
+            self.assertNotIn("b.csv", etl_code.load_manifest()["files"])
+            self.check_manifest()
+        self.run_all_formats(test)
+
+    def test_failed_append_leaves_target_alone(self):
+        def test():
+            self.write_source("a.csv", "a", 3)
+            etl_code.run_incremental()
+            before = self.target_files()
+            with self.assertRaises(RuntimeError):
+                with etl_code.open_target(append=True) as sink:
+                    sink.write(etl_code.read_target())
+                    raise RuntimeError("load failed")
+            self.assertEqual(self.target_files(), before)
+            self.assertEqual(self.target_names(), ["a_0", "a_1", "a_2"])
+        self.run_all_formats(test)
+
+    def test_nothing_new_leaves_target_alone(self):
+        def test():
+            self.write_source("a.csv", "a", 3)
+            etl_code.run_incremental()
+            before = self.target_files()
+            self.assertEqual(etl_code.run_incremental(), 0)
+            self.assertEqual(self.target_files(), before)
+            self.assertEqual(self.target_names(), ["a_0", "a_1", "a_2"])
+        self.run_all_formats(test)
+
+class QuarantineTest(unittest.TestCase):
+    '''Files the parsers cannot read as their schema says are quarantined, 
+    any other error is a bug and stops the run '''
+    files = {"bad.csv": "name,height,weight\na,tall,1\n", 
+             "no_weight.csv": "name,height\na,1\n",
+             "bad.json": '{"name": "a", "height": "x", "weight": 1}\n', 
+             "broken.json": '{"name": \n', 
+             "broken.xml": "<data><person><name>a</name>", 
+             "bad.xml": "<data><person><name>a</name><height>x</height><weight>1</weight></person></data>"}
+
+    def setUp(self):
+        self.previous = os.getcwd()
+        self.directory = tempfile.mkdtemp(prefix="etl_test_")
+        os.chdir(self.directory)
+        with open("good.csv", "w", encoding="utf-8") as f:
+            f.write("name,height,weight\na,60,150\n")
+        for name, text in self.files.items():
+            with open(name, "w", encoding="utf-8") as f:
+                f.write(text)
+
+    def tearDown(self):
+        os.chdir(self.previous)
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_mismatches_are_quarantined(self):
+        self.assertEqual(etl_code.extract()["name"].tolist(), ["a"])
+        self.assertEqual(sorted(os.listdir(etl_code.quarantine_dir)), sorted(self.files))
+
+    def test_mismatches_are_quarantined_when_streaming(self):
+        self.assertEqual(sum(len(chunk) for chunk in etl_code.extract_chunks(1)), 1)
+        self.assertEqual(sorted(os.listdir(etl_code.quarantine_dir)), sorted(self.files))
+
+    def test_other_errors_are_not_quarantined(self):
+        def broken_conform(dataframe, schema, file_to_process):
+            raise KeyError("a bug")
+        for name in self.files:
+            os.remove(name) # only good.csv is left, which parses
+        conform = etl_code.conform
+        etl_code.conform = broken_conform
+        try:
+            with self.assertRaises(KeyError):
+                etl_code.extract()
+        finally:
+            etl_code.conform = conform
+        self.assertFalse(os.path.exists(etl_code.quarantine_dir))
+
+if __name__ == "__main__":
+    unittest.main()